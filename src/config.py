@@ -1,8 +1,10 @@
 """
 Config Manager - Auto-save configuration
 """
+import functools
 import json
 import os
+import threading
 from pathlib import Path
 from typing import Any
 
@@ -12,6 +14,7 @@ class Config:
 
     DEFAULT_CONFIG = {
         "thread_count": 1,
+        "thread_cap": 128,
         "batch_size": 10,
         "delay_ms": 1000,
         "chrome_position": "left",
@@ -20,6 +23,13 @@ class Config:
         "profiles_dir": "./profiles/",
         "openrouter_api_key": "",
         "openrouter_model": "",
+        "openrouter_max_concurrency": 4,
+        # Extra API keys, used in turn with openrouter_api_key
+        "openrouter_api_keys": [],
+        # Local prompt cache (reuse responses for repeated variations)
+        "prompt_cache_enabled": False,
+        "prompt_cache_reuse_ratio": 0.7,
+        "prompt_cache_ttl_hours": 168,
         "timeout_seconds": 60,
         "verbose_logging": True,
         "logged_in": False,
@@ -29,6 +39,10 @@ class Config:
         # Video mode: auto-prompt toggle + duration
         "video_auto_prompt_enabled": True,
         "video_duration": 6,
+        # Pause between videos sent to Grok
+        "video_delay_ms": 2000,
+        # FFmpeg decode accelerator for frame extraction ("", "auto", "cuda", ...)
+        "ffmpeg_hwaccel": "",
         "video_manual_prompts": []
     }
 
@@ -53,6 +67,8 @@ class Config:
         else:
             self.config_path = Path(config_path)
 
+        # Lock for writes (config may be saved from background threads)
+        self._lock = threading.RLock()
         self._config = self._load_config()
 
     def _load_config(self) -> dict:
@@ -73,14 +89,15 @@ class Config:
 
     def _save_config(self, config: dict = None):
         """Save config to file."""
-        if config is None:
-            config = self._config
+        with self._lock:
+            if config is None:
+                config = self._config
 
-        # Ensure parent directory exists
-        self.config_path.parent.mkdir(parents=True, exist_ok=True)
+            # Ensure parent directory exists
+            self.config_path.parent.mkdir(parents=True, exist_ok=True)
 
-        with open(self.config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
+            with open(self.config_path, 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=4, ensure_ascii=False)
 
     def get(self, key: str, default: Any = None) -> Any:
         """Get config value."""
@@ -88,8 +105,9 @@ class Config:
 
     def set(self, key: str, value: Any):
         """Set config value and auto-save."""
-        self._config[key] = value
-        self._save_config()
+        with self._lock:
+            self._config[key] = value
+            self._save_config()
 
     def get_all(self) -> dict:
         """Get all config values."""
@@ -97,13 +115,15 @@ class Config:
 
     def update(self, values: dict):
         """Update multiple values and auto-save."""
-        self._config.update(values)
-        self._save_config()
+        with self._lock:
+            self._config.update(values)
+            self._save_config()
 
     def reset(self):
         """Reset to default config."""
-        self._config = self.DEFAULT_CONFIG.copy()
-        self._save_config()
+        with self._lock:
+            self._config = self.DEFAULT_CONFIG.copy()
+            self._save_config()
 
     def get_path(self, key: str) -> Path:
         """Get path config value resolved relative to app root."""
@@ -131,8 +151,14 @@ class Config:
 _config_instance = None
 
 
+@functools.lru_cache(maxsize=1)
 def get_config() -> Config:
-    """Get global config instance."""
+    """
+    Get global config instance.
+
+    Cached: every call returns the same shared Config object, so changes
+    made through one reference are visible to all callers.
+    """
     global _config_instance
     if _config_instance is None:
         _config_instance = Config()
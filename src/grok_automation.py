@@ -1,11 +1,13 @@
 """
 Grok Automation - Interact with Grok Imagine website
 """
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -17,6 +19,28 @@ from .config import get_config
 from .logger import get_logger
 
 
+# Max concurrent image downloads
+MAX_DOWNLOAD_WORKERS = 8
+
+# One requests.Session per download thread (Session is not thread-safe)
+_http_local = threading.local()
+
+
+def _get_http_session() -> requests.Session:
+    """Get the keep-alive HTTP session for the current thread."""
+    session = getattr(_http_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _http_local.session = session
+    return session
+
+
+class WaitResult(NamedTuple):
+    """Result of waiting for an image batch."""
+    downloaded: int
+    rate_limited: bool
+
+
 class GrokAutomation:
     """Automate Grok Imagine for image and video generation."""
     
@@ -79,6 +103,16 @@ class GrokAutomation:
         self.config = get_config()
         self.logger = get_logger()
         self.driver = browser_manager.get_driver()
+        self._download_pool: Optional[ThreadPoolExecutor] = None
+    
+    def _get_download_pool(self) -> ThreadPoolExecutor:
+        """Get the thread pool used for parallel image downloads."""
+        if self._download_pool is None:
+            self._download_pool = ThreadPoolExecutor(
+                max_workers=MAX_DOWNLOAD_WORKERS,
+                thread_name_prefix="ImageDownload"
+            )
+        return self._download_pool
     
     def navigate_to_imagine(self) -> bool:
         """Navigate to Grok Imagine page."""
@@ -130,6 +164,29 @@ class GrokAutomation:
             self.logger.error(f"Không thể nhập prompt: {e}")
             return False
     
+    def wait_input_ready(self, timeout: float = 0.5) -> bool:
+        """
+        Wait until the submit button is enabled after entering a prompt.
+        
+        Args:
+            timeout: Maximum wait time in seconds
+            
+        Returns:
+            True if the button became enabled before timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                submit_btn = self.driver.find_element(By.CSS_SELECTOR, self.SUBMIT_BTN)
+                if submit_btn.get_attribute("disabled") is None:
+                    return True
+            except Exception:
+                pass
+            
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+    
     def submit_prompt(self) -> bool:
         """Submit the prompt by clicking send button."""
         try:
@@ -191,7 +248,8 @@ class GrokAutomation:
         except Exception:
             return False
 
-    def wait_for_generation_complete(self, initial_count: int = 0, timeout: int = None) -> bool:
+    def wait_for_generation_complete(self, initial_count: int = 0, timeout: int = None,
+                                     target_dir: Optional[Path] = None) -> WaitResult:
         """
         Wait for generation to complete, then scan and download images.
         Scans 5 times with 10s interval to ensure all images are captured.
@@ -199,9 +257,11 @@ class GrokAutomation:
         Args:
             initial_count: Number of images before submitting prompt
             timeout: Maximum wait time in seconds
+            target_dir: Directory to save images (already created);
+                defaults to images_dir from config
             
         Returns:
-            True if new images are generated
+            WaitResult with number of downloaded images and rate limit flag
         """
         if timeout is None:
             timeout = self.config.get("timeout_seconds", 60)
@@ -218,8 +278,11 @@ class GrokAutomation:
 
         # Track processed images to prevent duplicates (persists across all scans)
         processed_srcs = set()
-        output_dir = Path(self.config.get("images_dir", "./images"))
-        output_dir.mkdir(parents=True, exist_ok=True)
+        if target_dir is not None:
+            output_dir = target_dir
+        else:
+            output_dir = Path(self.config.get("images_dir", "./images"))
+            output_dir.mkdir(parents=True, exist_ok=True)
         
         # Wait for generation to start and complete
         last_log_time = 0
@@ -261,7 +324,7 @@ class GrokAutomation:
                         break
                     else:
                         self.logger.error("Đã đạt rate limit - Dừng toàn bộ quá trình")
-                        return False
+                        return WaitResult(0, True)
                 
             except Exception as e:
                 self.logger.debug(f"Lỗi khi kiểm tra: {e}")
@@ -269,7 +332,7 @@ class GrokAutomation:
             time.sleep(1)
         else:
             self.logger.error("Hết thời gian chờ tạo ảnh")
-            return False
+            return WaitResult(0, False)
         
         # Scan and download images - 5 times with 10s interval
         # Nếu rate limit đã được phát hiện trước đó, chỉ quét 1 lần rồi dừng
@@ -313,6 +376,7 @@ class GrokAutomation:
             jpeg_count = 0
             png_count = 0
             new_downloads = 0
+            pending_urls = []  # (src, filename) tải song song sau khi quét
             
             for img in all_images:
                 # Check limit before each download
@@ -344,13 +408,20 @@ class GrokAutomation:
                     # URL-based image (also valid)
                     if src not in processed_srcs:
                         self.logger.info(f"Phát hiện ảnh URL mới, đang tải xuống...")
-                        try:
-                            self._download_single_image(src, output_dir, get_timestamp_filename(len(processed_srcs) + 1))
-                            processed_srcs.add(src)
-                            new_downloads += 1
-                            self.logger.success(f"Đã tải ảnh {len(processed_srcs)}/{max_images}")
-                        except Exception as dl_err:
-                            self.logger.error(f"Lỗi tải ảnh: {dl_err}")
+                        pending_urls.append((src, get_timestamp_filename(len(processed_srcs) + 1)))
+                        processed_srcs.add(src)
+            
+            if pending_urls:
+                # Tải đồng thời các ảnh URL của lần quét này
+                pool = self._get_download_pool()
+                results = pool.map(
+                    lambda item: self._download_single_image(item[0], output_dir, item[1]),
+                    pending_urls
+                )
+                for ok in results:
+                    if ok:
+                        new_downloads += 1
+                self.logger.success(f"Đã tải ảnh {len(processed_srcs)}/{max_images}")
             
             self.logger.info(f"Lần quét {scan_num}: Tổng ảnh: {total_images} | JPEG: {jpeg_count} | PNG (bỏ qua): {png_count} | Mới tải: {new_downloads} | Tổng đã tải: {len(processed_srcs)}")
             
@@ -361,12 +432,11 @@ class GrokAutomation:
         
         self.logger.info(f"Batch hoàn thành! Đã tải {len(processed_srcs)} ảnh")
         
-        # Nếu rate limit đã phát hiện, trả về tuple (số ảnh, "rate_limit") để dừng các batch tiếp theo
+        # Nếu rate limit đã phát hiện, đánh dấu rate_limited để dừng các batch tiếp theo
         if rate_limit_detected:
             self.logger.warning("Rate limit đã đạt - Dừng sau khi tải ảnh")
-            return (len(processed_srcs), "rate_limit")
         
-        return len(processed_srcs)
+        return WaitResult(len(processed_srcs), rate_limit_detected)
 
     def has_generating_placeholders(self) -> bool:
         """Check if there are generating placeholder images (Base64 PNGs) in the generation list."""
@@ -415,19 +485,21 @@ class GrokAutomation:
             self.logger.debug(f"Lỗi khi kiểm tra rate limit: {e}")
             return False
     
-    def wait_for_images(self, timeout: int = None, min_count: int = 1) -> bool:
+    def wait_for_images(self, timeout: int = None, min_count: int = 1,
+                        target_dir: Optional[Path] = None) -> WaitResult:
         """
         Wait for images to be generated (legacy method, uses smart polling internally).
         
         Args:
             timeout: Maximum wait time in seconds
             min_count: Minimum number of NEW images to wait for
+            target_dir: Directory to save images (already created)
             
         Returns:
-            True if images are ready
+            WaitResult with number of downloaded images and rate limit flag
         """
         initial_count = self.count_current_images()
-        return self.wait_for_generation_complete(initial_count, timeout)
+        return self.wait_for_generation_complete(initial_count, timeout, target_dir)
     
     def get_image_urls(self, count: int = 4) -> List[str]:
         """
@@ -472,12 +544,12 @@ class GrokAutomation:
         output_path = Path(output_dir)
         output_path.mkdir(parents=True, exist_ok=True)
         
-        saved_files = []
         timestamp = datetime.now().strftime("%d-%m_%H-%M-%S")
         
-        for idx, url in enumerate(urls, 1):
+        def download(item):
+            idx, url = item
             try:
-                response = requests.get(url, timeout=30)
+                response = _get_http_session().get(url, timeout=30)
                 
                 if response.status_code == 200:
                     filename = f"{timestamp}_{idx:03d}.jpg"
@@ -486,15 +558,18 @@ class GrokAutomation:
                     with open(filepath, 'wb') as f:
                         f.write(response.content)
                     
-                    saved_files.append(str(filepath))
                     self.logger.info(f"Đã tải: {filename}")
+                    return str(filepath)
                 else:
                     self.logger.error(f"Không thể tải ảnh {idx}: HTTP {response.status_code}")
                     
             except Exception as e:
                 self.logger.error(f"Không thể tải ảnh {idx}: {e}")
+            return None
         
-        return saved_files
+        # Tải song song, giữ thứ tự kết quả theo urls
+        results = self._get_download_pool().map(download, enumerate(urls, 1))
+        return [path for path in results if path]
     
     def wait_for_video(self, timeout: int = None) -> bool:
         """
@@ -601,7 +676,7 @@ class GrokAutomation:
     def _download_single_image(self, url: str, output_dir: Path, filename: str) -> bool:
         """Download a single image from URL."""
         try:
-            response = requests.get(url, timeout=30)
+            response = _get_http_session().get(url, timeout=30)
             if response.status_code == 200:
                 filepath = output_dir / filename
                 with open(filepath, 'wb') as f:
@@ -1138,13 +1213,21 @@ class GrokAutomation:
         Returns:
             True if successful
         """
-        import glob
-        import shutil
+        if not self.click_download_button():
+            return False
+        return self.wait_for_download(output_path, timeout)
+    
+    def click_download_button(self) -> bool:
+        """
+        Click the Download button for the current video (browser thread).
+        
+        Pair with wait_for_download(), which only touches the file system
+        and can run on another thread while the browser is used meanwhile.
         
+        Returns:
+            True if the button was clicked
+        """
         try:
-            output_path = Path(output_path)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
             self.logger.info(f"Đang tải video qua nút Download...")
             
             # Find and click the Download button
@@ -1172,11 +1255,34 @@ class GrokAutomation:
             # Click download button
             download_btn.click()
             self.logger.info("Đã click nút Download")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Lỗi tải video qua nút Download: {e}")
+            return False
+    
+    def wait_for_download(self, output_path: str, timeout: int = 60) -> bool:
+        """
+        Wait for the clicked download to land in Downloads and move it.
+        
+        Does not use the WebDriver, so it is safe to call off the browser
+        thread.
+        
+        Args:
+            output_path: Where to save the downloaded video
+            timeout: Maximum time to wait for download
+            
+        Returns:
+            True if successful
+        """
+        import shutil
+        
+        try:
+            output_path = Path(output_path)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
             
             # Wait for download to complete
             # Check Downloads folder for new mp4 file
-            import time
-            import os
             
             # Get user's Downloads folder
             downloads_folder = Path.home() / "Downloads"
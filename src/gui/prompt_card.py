@@ -7,6 +7,10 @@ from ttkbootstrap.constants import *
 from typing import Callable, Optional
 
 
+# Bindtag chung cho mọi Text trong prompt card
+PROMPT_TEXT_BINDTAG = "PromptText"
+
+
 class PromptCard(ttk.Frame):
     """
     Prompt card widget với chức năng expand/collapse.
@@ -44,36 +48,35 @@ class PromptCard(ttk.Frame):
         self._on_change = on_change
         self._show_video2 = show_video2
         self._expanded = False
+        self._loading_text = False
         
-        self._setup_ui(initial_text, video2_text)
+        # Nội dung prompt lưu trong StringVar; Entry (thu gọn) và Text (mở rộng)
+        # cùng đọc/ghi vào đây
+        self._var1 = tk.StringVar(value=initial_text)
+        self._var2 = tk.StringVar(value=video2_text)
+        self._var1.trace_add("write", self._on_var_change)
+        self._var2.trace_add("write", self._on_var_change)
+        
+        self._setup_ui()
     
-    def _setup_ui(self, initial_text: str, video2_text: str):
-        """Thiết lập UI components."""
+    def _setup_ui(self):
+        """Thiết lập UI components (dùng grid để giảm số lần tính lại layout)."""
         # Outer frame with border
         self.configure(bootstyle="secondary", padding=5)
+        self.grid_columnconfigure(0, weight=1)
         
         # Header frame
         header = ttk.Frame(self)
-        header.pack(fill=X, pady=(0, 5))
+        header.grid(row=0, column=0, sticky=EW, pady=(0, 5))
+        header.grid_columnconfigure(0, weight=1)
         
         # Title label
-        title_text = f"Prompt {self.index}" if not self._show_video2 else f"Batch {self.index}"
         self._title_label = ttk.Label(
             header,
-            text=title_text,
+            text=self._get_title_text(),
             font=("", 10, "bold")
         )
-        self._title_label.pack(side=LEFT)
-        
-        # Delete button (X)
-        self._delete_btn = ttk.Button(
-            header,
-            text="X",
-            bootstyle="danger-outline",
-            width=3,
-            command=self._on_delete_click
-        )
-        self._delete_btn.pack(side=RIGHT, padx=2)
+        self._title_label.grid(row=0, column=0, sticky=W)
         
         # Expand/Collapse button
         self._expand_btn = ttk.Button(
@@ -83,48 +86,135 @@ class PromptCard(ttk.Frame):
             width=3,
             command=self._toggle_expand
         )
-        self._expand_btn.pack(side=RIGHT, padx=2)
+        self._expand_btn.grid(row=0, column=1, padx=2)
+        
+        # Delete button (X)
+        self._delete_btn = ttk.Button(
+            header,
+            text="X",
+            bootstyle="danger-outline",
+            width=3,
+            command=self._on_delete_click
+        )
+        self._delete_btn.grid(row=0, column=2, padx=2)
         
         # Content frame for text areas
-        content = ttk.Frame(self)
-        content.pack(fill=BOTH, expand=True)
+        # Rows: 0 = label video 1, 1 = text 1, 2 = label video 2, 3 = text 2
+        self._content = ttk.Frame(self)
+        self._content.grid(row=1, column=0, sticky=NSEW)
+        self._content.grid_columnconfigure(0, weight=1)
         
-        # Text area 1 (main prompt or video1_prompt)
-        if self._show_video2:
-            ttk.Label(content, text="Prompt Video 1:", foreground="gray").pack(anchor=W)
+        # Label cho text area 1 (chỉ hiện khi có video 2)
+        self._label1 = None
         
-        self._text1_frame = ttk.Frame(content)
-        self._text1_frame.pack(fill=X, pady=2)
+        # Prompt 1 (main prompt or video1_prompt).
+        # Khi thu gọn chỉ dùng ttk.Entry; tk.Text chỉ được tạo khi mở rộng
+        self._entry1 = self._create_entry(self._var1, row=1)
+        self._text1 = None
         
-        self._text1 = tk.Text(
-            self._text1_frame,
+        # Prompt 2 (for video 12s). Các widget của phần này được lưu trong
+        # _video2_widgets để ẩn/hiện mà không cần winfo_children()
+        self._label2 = None
+        self._entry2 = None
+        self._text2 = None
+        self._video2_widgets: list = []
+        if self._show_video2:
+            self._create_video2_widgets()
+    
+    def _create_entry(self, var: tk.StringVar, row: int) -> ttk.Entry:
+        """Tạo Entry 1 dòng cho trạng thái thu gọn."""
+        entry = ttk.Entry(self._content, textvariable=var, font=("", 10))
+        entry.grid(row=row, column=0, sticky=EW, pady=2)
+        return entry
+    
+    def _create_text(self) -> tk.Text:
+        """Tạo Text nhiều dòng cho trạng thái mở rộng."""
+        # Tắt undo stack và export selection: card không dùng undo, và
+        # export selection gây round-trip selection X11 mỗi lần bôi đen
+        text = tk.Text(
+            self._content,
             height=1,
             wrap=tk.WORD,
-            font=("", 10)
+            font=("", 10),
+            undo=False,
+            autoseparators=False,
+            maxundo=0,
+            exportselection=False
         )
-        self._text1.pack(fill=X, expand=True)
-        self._text1.insert("1.0", initial_text)
-        self._text1.bind("<<Modified>>", self._on_text_change)
-        self._text1.bind("<KeyRelease>", self._on_text_change)
+        # <<Modified>> được xử lý một lần ở PromptCardsContainer qua bindtag này
+        text.bindtags(text.bindtags() + (PROMPT_TEXT_BINDTAG,))
+        return text
+    
+    def _load_text(self, text_widget: tk.Text, var: tk.StringVar):
+        """Đồng bộ nội dung Text theo StringVar (nếu khác)."""
+        value = var.get()
+        if text_widget.get("1.0", "end-1c") == value:
+            return
         
-        # Text area 2 (for video 12s)
-        self._text2 = None
-        if self._show_video2:
-            ttk.Label(content, text="Prompt Video 2:", foreground="gray").pack(anchor=W, pady=(5, 0))
-            
-            self._text2_frame = ttk.Frame(content)
-            self._text2_frame.pack(fill=X, pady=2)
-            
-            self._text2 = tk.Text(
-                self._text2_frame,
-                height=1,
-                wrap=tk.WORD,
-                font=("", 10)
-            )
-            self._text2.pack(fill=X, expand=True)
-            self._text2.insert("1.0", video2_text)
-            self._text2.bind("<<Modified>>", self._on_text_change)
-            self._text2.bind("<KeyRelease>", self._on_text_change)
+        self._loading_text = True
+        try:
+            text_widget.delete("1.0", tk.END)
+            text_widget.insert("1.0", value)
+            text_widget.edit_modified(False)
+        finally:
+            self._loading_text = False
+    
+    def _expand_prompt(self, entry: ttk.Entry, text_widget: Optional[tk.Text],
+                       var: tk.StringVar, row: int) -> tk.Text:
+        """Ẩn Entry và hiện Text (tạo nếu chưa có) cho một prompt."""
+        entry.grid_remove()
+        if text_widget is None:
+            text_widget = self._create_text()
+        self._load_text(text_widget, var)
+        text_widget.grid(row=row, column=0, sticky=EW, pady=2)
+        self._auto_resize_text(text_widget)
+        return text_widget
+    
+    def _collapse_prompt(self, entry: ttk.Entry, text_widget: Optional[tk.Text]):
+        """Ẩn Text và hiện lại Entry cho một prompt."""
+        if text_widget is not None:
+            text_widget.grid_remove()
+        entry.grid()
+    
+    def _create_video2_widgets(self):
+        """Tạo label cho prompt 1 và ô nhập thứ 2 (video 12s)."""
+        self._label1 = ttk.Label(self._content, text="Prompt Video 1:", foreground="gray")
+        self._label1.grid(row=0, column=0, sticky=W)
+        
+        self._label2 = ttk.Label(self._content, text="Prompt Video 2:", foreground="gray")
+        self._label2.grid(row=2, column=0, sticky=W, pady=(5, 0))
+        
+        self._entry2 = self._create_entry(self._var2, row=3)
+        
+        self._video2_widgets = [self._label1, self._label2, self._entry2]
+        
+        if self._expanded:
+            self._expand_prompt2()
+    
+    def _expand_prompt2(self):
+        """Mở rộng prompt 2, ghi nhận Text mới tạo vào _video2_widgets."""
+        created = self._text2 is None
+        self._text2 = self._expand_prompt(self._entry2, self._text2, self._var2, row=3)
+        if created:
+            self._video2_widgets.append(self._text2)
+    
+    def _show_video2_widgets(self):
+        """Hiện lại label prompt 1 và ô nhập thứ 2 đã tạo trước đó."""
+        self._label1.grid()
+        self._label2.grid()
+        if self._expanded:
+            self._expand_prompt2()
+        else:
+            self._collapse_prompt(self._entry2, self._text2)
+    
+    def _hide_video2_widgets(self):
+        """Ẩn label prompt 1 và ô nhập thứ 2 (giữ widget để hiện lại nhanh)."""
+        for widget in reversed(self._video2_widgets):
+            widget.grid_remove()
+    
+    def _get_title_text(self) -> str:
+        """Lấy tiêu đề card theo chế độ hiển thị."""
+        return f"Prompt {self.index}" if not self._show_video2 else f"Batch {self.index}"
     
     def _toggle_expand(self):
         """Toggle expand/collapse text areas."""
@@ -132,23 +222,23 @@ class PromptCard(ttk.Frame):
         
         if self._expanded:
             self._expand_btn.configure(text="▲")
-            self._auto_resize_text(self._text1)
-            if self._text2:
-                self._auto_resize_text(self._text2)
+            self._text1 = self._expand_prompt(self._entry1, self._text1, self._var1, row=1)
+            if self._show_video2:
+                self._expand_prompt2()
         else:
             self._expand_btn.configure(text="▼")
-            self._text1.configure(height=1)
-            if self._text2:
-                self._text2.configure(height=1)
+            self._collapse_prompt(self._entry1, self._text1)
+            if self._show_video2:
+                self._collapse_prompt(self._entry2, self._text2)
     
     def _auto_resize_text(self, text_widget: tk.Text):
         """Tự động resize text area theo nội dung."""
-        content = text_widget.get("1.0", tk.END)
-        lines = content.count('\n') + 1
-        # Tính số dòng dựa trên độ dài text và wrap
-        char_count = len(content)
-        # Ước tính khoảng 80 ký tự / dòng
-        estimated_lines = max(lines, (char_count // 80) + 1)
+        # Một lệnh Tk trả về cả số ký tự, số dòng logic và số dòng hiển thị
+        # (đã tính wrap), không cần copy nội dung text sang Python
+        counts = text_widget.count("1.0", tk.END, "chars", "lines", "displaylines")
+        char_count, lines, display_lines = counts or (0, 0, 0)
+        # Ước tính khoảng 80 ký tự / dòng khi widget chưa được layout
+        estimated_lines = max(lines + 1, display_lines, (char_count // 80) + 1)
         # Giới hạn tối đa 10 dòng
         height = min(max(estimated_lines, 2), 10)
         text_widget.configure(height=height)
@@ -159,11 +249,24 @@ class PromptCard(ttk.Frame):
             self._on_delete(self.index)
     
     def _on_text_change(self, event=None):
-        """Xử lý khi text thay đổi."""
+        """Xử lý khi Text thay đổi: ghi nội dung ngược lại StringVar."""
+        if event is None:
+            return
+        
+        widget = event.widget
         # Reset modified flag
-        if hasattr(event, 'widget'):
-            event.widget.edit_modified(False)
+        widget.edit_modified(False)
+        
+        if self._loading_text:
+            return
         
+        var = self._var1 if widget is self._text1 else self._var2
+        value = widget.get("1.0", "end-1c")
+        if value != var.get():
+            var.set(value)
+    
+    def _on_var_change(self, *args):
+        """Xử lý khi nội dung prompt (StringVar) thay đổi."""
         if self._on_change:
             self._on_change()
     
@@ -175,45 +278,48 @@ class PromptCard(ttk.Frame):
             Dict với keys: 'video1' (và 'video2' nếu show_video2=True)
             hoặc chỉ text string nếu là image prompt
         """
-        text1 = self._text1.get("1.0", tk.END).strip()
+        text1 = self._var1.get().strip()
         
         if self._show_video2:
-            text2 = self._text2.get("1.0", tk.END).strip() if self._text2 else ""
+            text2 = self._var2.get().strip()
             return {"video1": text1, "video2": text2}
         else:
             return text1
     
     def set_prompts(self, video1: str, video2: str = ""):
         """Set nội dung prompts."""
-        self._text1.delete("1.0", tk.END)
-        self._text1.insert("1.0", video1)
+        self._var1.set(video1)
+        if self._text1 is not None:
+            self._load_text(self._text1, self._var1)
         
-        if self._text2 and video2:
-            self._text2.delete("1.0", tk.END)
-            self._text2.insert("1.0", video2)
+        if video2:
+            self._var2.set(video2)
+            if self._text2 is not None:
+                self._load_text(self._text2, self._var2)
     
     def update_index(self, new_index: int):
         """Cập nhật số thứ tự card."""
         self.index = new_index
-        title_text = f"Prompt {self.index}" if not self._show_video2 else f"Batch {self.index}"
-        self._title_label.configure(text=title_text)
+        self._title_label.configure(text=self._get_title_text())
     
     def set_show_video2(self, show: bool):
         """
         Thay đổi chế độ hiển thị (1 hay 2 text areas).
-        Cần rebuild UI nếu thay đổi.
+        Chỉ ẩn/hiện phần ô nhập thứ 2 (tạo ở lần hiện đầu tiên), không rebuild card.
         """
-        if self._show_video2 != show:
-            self._show_video2 = show
-            # Lấy text hiện tại
-            current_text1 = self._text1.get("1.0", tk.END).strip()
-            current_text2 = self._text2.get("1.0", tk.END).strip() if self._text2 else ""
-            
-            # Clear và rebuild
-            for widget in self.winfo_children():
-                widget.destroy()
-            
-            self._setup_ui(current_text1, current_text2)
+        if self._show_video2 == show:
+            return
+        
+        self._show_video2 = show
+        if show:
+            if self._entry2 is None:
+                self._create_video2_widgets()
+            else:
+                self._show_video2_widgets()
+        else:
+            self._hide_video2_widgets()
+        
+        self._title_label.configure(text=self._get_title_text())
 
 
 class PromptCardsContainer(ttk.Frame):
@@ -221,6 +327,8 @@ class PromptCardsContainer(ttk.Frame):
     Container quản lý nhiều PromptCard widgets.
     """
     
+    _text_class_bound = False
+    
     def __init__(
         self,
         parent,
@@ -242,10 +350,19 @@ class PromptCardsContainer(ttk.Frame):
         self._on_change = on_change
         self._cards: list[PromptCard] = []
         
+        # Cache kết quả get_all_prompts, đánh dấu dirty khi có thay đổi
+        self._prompts_cache: list = []
+        self._dirty = True
+        
         self._setup_ui()
     
     def _setup_ui(self):
         """Thiết lập UI."""
+        # Một binding duy nhất cho <<Modified>> của tất cả Text trong các card
+        if not PromptCardsContainer._text_class_bound:
+            self.bind_class(PROMPT_TEXT_BINDTAG, "<<Modified>>", self._on_any_text_change)
+            PromptCardsContainer._text_class_bound = True
+        
         # Scrollable frame for cards
         self._cards_frame = ttk.Frame(self)
         self._cards_frame.pack(fill=BOTH, expand=True)
@@ -309,12 +426,23 @@ class PromptCardsContainer(ttk.Frame):
             self._update_count()
             self._notify_change()
     
+    @staticmethod
+    def _on_any_text_change(event):
+        """Chuyển sự kiện <<Modified>> tới PromptCard chứa Text đó."""
+        card = event.widget.master
+        while card is not None and not isinstance(card, PromptCard):
+            card = card.master
+        
+        if card is not None:
+            card._on_text_change(event)
+    
     def _on_card_change(self):
         """Callback khi một card thay đổi."""
         self._notify_change()
     
     def _notify_change(self):
         """Thông báo thay đổi ra ngoài."""
+        self._dirty = True
         if self._on_change:
             self._on_change()
     
@@ -330,7 +458,10 @@ class PromptCardsContainer(ttk.Frame):
         Returns:
             List of prompts (strings cho image, dicts cho video)
         """
-        return [card.get_prompts() for card in self._cards]
+        if self._dirty:
+            self._prompts_cache = [card.get_prompts() for card in self._cards]
+            self._dirty = False
+        return list(self._prompts_cache)
     
     def set_prompts(self, prompts: list):
         """
@@ -357,6 +488,7 @@ class PromptCardsContainer(ttk.Frame):
         for card in self._cards:
             card.destroy()
         self._cards.clear()
+        self._dirty = True
         self._update_count()
     
     def set_show_video2(self, show: bool):
@@ -365,6 +497,7 @@ class PromptCardsContainer(ttk.Frame):
         """
         if self._show_video2 != show:
             self._show_video2 = show
+            self._dirty = True
             for card in self._cards:
                 card.set_show_video2(show)
             
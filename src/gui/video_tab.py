@@ -1,7 +1,9 @@
 """
 Video Tab - Video generation controls
 """
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
@@ -32,11 +34,30 @@ class VideoTab(ttk.Frame):
         self._on_stop = on_stop
         self._running = False
         
+        # Trạng thái hiện tại của nút/status để bỏ qua configure thừa
+        self._start_enabled = True
+        self._stop_enabled = False
+        self._status_text = "Sẵn sàng"
+        
+        # Worker ghi config (ghi file) ngoài UI thread
+        self._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="VideoTabIO")
+        
+        # Debounce lưu prompts khi đang gõ
+        self._save_after_id = None
+        self.bind("<Destroy>", self._on_destroy)
+        
+        # Các phần ít dùng (prompt thủ công, trạng thái) chỉ được tạo khi tab
+        # được hiển thị lần đầu
+        self._manual_prompts_frame = None
+        self._prompts_container = None
+        self._status_outer = None
+        self._ui_ready = False
+        
         self._setup_ui()
-        self._load_prompts_from_config()
+        self.bind("<Map>", self._on_first_visible)
     
     def _setup_ui(self):
-        """Setup the UI components."""
+        """Setup the UI components (phần khung luôn hiển thị)."""
         # Create scrollable container
         self._scrollable = ScrollableFrame(self)
         self._scrollable.pack(fill=BOTH, expand=True)
@@ -164,9 +185,54 @@ class VideoTab(ttk.Frame):
         )
         batch_spin.pack(side=LEFT, padx=5)
         
+        self._container = container
+        
+        # Control buttons
+        self._btn_frame = ttk.Frame(container)
+        self._btn_frame.pack(fill=X, padx=20, pady=20)
+        
+        self._start_btn = ttk.Button(
+            self._btn_frame,
+            text="Bắt Đầu",
+            bootstyle="success",
+            command=self._on_start_click,
+            width=15
+        )
+        self._start_btn.pack(side=LEFT, padx=5)
+        
+        self._stop_btn = ttk.Button(
+            self._btn_frame,
+            text="Dừng",
+            bootstyle="danger",
+            command=self._on_stop_click,
+            width=15,
+            state=DISABLED
+        )
+        self._stop_btn.pack(side=LEFT, padx=5)
+        
+        # Update UI based on initial states
+        self._update_ui_for_auto_prompt()
+    
+    def _on_first_visible(self, event=None):
+        """Tạo các phần còn lại của tab khi tab được hiển thị lần đầu."""
+        if event is not None and event.widget is not self:
+            return
+        if self._ui_ready:
+            return
+        
+        self.unbind("<Map>")
+        self._ui_ready = True
+        self._ensure_status_frame()
+        # Phần prompt thủ công chỉ được tạo khi tắt auto-prompt
+        self._update_ui_for_auto_prompt()
+    
+    def _ensure_manual_prompts(self):
+        """Tạo phần prompt thủ công (nếu chưa có) và load prompts từ config."""
+        if self._manual_prompts_frame is not None:
+            return
+        
         # Manual prompts section (shown when auto-prompt is disabled)
-        self._manual_prompts_frame = ttk.Labelframe(container, text="Prompt Thủ Công")
-        self._manual_prompts_frame.pack(fill=BOTH, expand=True, padx=20, pady=10)
+        self._manual_prompts_frame = ttk.Labelframe(self._container, text="Prompt Thủ Công")
         
         # Prompt container - show_video2 depends on duration
         show_video2 = self._duration_var.get() == 12
@@ -177,15 +243,22 @@ class VideoTab(ttk.Frame):
         )
         self._prompts_container.pack(fill=BOTH, expand=True, padx=10, pady=10)
         
+        self._load_prompts_from_config()
+    
+    def _ensure_status_frame(self):
+        """Tạo phần trạng thái (nếu chưa có), đặt ngay trên các nút điều khiển."""
+        if self._status_outer is not None:
+            return
+        
         # Status frame
-        status_outer = ttk.Labelframe(container, text="Trạng Thái")
-        status_outer.pack(fill=X, padx=20, pady=10)
-        status_frame = ttk.Frame(status_outer, padding=15)
+        self._status_outer = ttk.Labelframe(self._container, text="Trạng Thái")
+        self._status_outer.pack(fill=X, padx=20, pady=10, before=self._btn_frame)
+        status_frame = ttk.Frame(self._status_outer, padding=15)
         status_frame.pack(fill=BOTH, expand=True)
         
         self._status_label = ttk.Label(
             status_frame,
-            text="Sẵn sàng",
+            text=self._status_text,
             font=("", 12)
         )
         self._status_label.pack(anchor=W)
@@ -205,32 +278,6 @@ class VideoTab(ttk.Frame):
             foreground="gray"
         )
         self._count_label.pack(anchor=W)
-        
-        # Control buttons
-        btn_frame = ttk.Frame(container)
-        btn_frame.pack(fill=X, padx=20, pady=20)
-        
-        self._start_btn = ttk.Button(
-            btn_frame,
-            text="Bắt Đầu",
-            bootstyle="success",
-            command=self._on_start_click,
-            width=15
-        )
-        self._start_btn.pack(side=LEFT, padx=5)
-        
-        self._stop_btn = ttk.Button(
-            btn_frame,
-            text="Dừng",
-            bootstyle="danger",
-            command=self._on_stop_click,
-            width=15,
-            state=DISABLED
-        )
-        self._stop_btn.pack(side=LEFT, padx=5)
-        
-        # Update UI based on initial states
-        self._update_ui_for_auto_prompt()
     
     def _load_prompts_from_config(self):
         """Load prompts từ config."""
@@ -244,8 +291,9 @@ class VideoTab(ttk.Frame):
         self.config.set("video_duration", duration)
         
         # Update prompt cards to show 1 or 2 text areas
-        show_video2 = duration == 12
-        self._prompts_container.set_show_video2(show_video2)
+        if self._prompts_container is not None:
+            show_video2 = duration == 12
+            self._prompts_container.set_show_video2(show_video2)
         
         self.logger.info(f"Đã chọn thời lượng video: {duration}s")
     
@@ -261,16 +309,65 @@ class VideoTab(ttk.Frame):
         if self._auto_prompt_var.get():
             # Auto-prompt enabled: show batch settings, hide manual prompts
             self._batch_frame.pack(fill=X, pady=5)
-            self._manual_prompts_frame.pack_forget()
+            if self._manual_prompts_frame is not None:
+                self._manual_prompts_frame.pack_forget()
         else:
             # Auto-prompt disabled: hide batch settings, show manual prompts
             self._batch_frame.pack_forget()
-            self._manual_prompts_frame.pack(fill=BOTH, expand=True, padx=20, pady=10)
+            if not self._ui_ready:
+                return
+            self._ensure_manual_prompts()
+            anchor = self._status_outer if self._status_outer is not None else self._btn_frame
+            self._manual_prompts_frame.pack(fill=BOTH, expand=True, padx=20, pady=10, before=anchor)
     
     def _on_prompts_change(self):
-        """Xử lý khi prompts thay đổi."""
+        """Xử lý khi prompts thay đổi (gộp các lần gõ liên tiếp, lưu sau 300ms)."""
+        if self._save_after_id:
+            self.after_cancel(self._save_after_id)
+        self._save_after_id = self.after(300, self._flush_prompts)
+    
+    def _flush_prompts(self):
+        """Lưu prompts hiện tại vào config."""
+        self._save_after_id = None
         prompts = self._prompts_container.get_all_prompts()
-        self.config.set("video_manual_prompts", prompts)
+        self._save_prompts(prompts)
+    
+    def _on_destroy(self, event=None):
+        """Lưu ngay lần lưu đang chờ (đồng bộ) rồi hủy timer khi tab bị destroy."""
+        if event is not None and event.widget is not self:
+            return
+        if self._save_after_id:
+            try:
+                prompts = self._prompts_container.get_all_prompts()
+            except tk.TclError:
+                # Widget con đã bị hủy trước: không còn đọc được prompts
+                prompts = None
+            if prompts is not None:
+                self.config.set("video_manual_prompts", prompts)
+            self.after_cancel(self._save_after_id)
+            self._save_after_id = None
+    
+    def _save_prompts(self, prompts: list):
+        """Lưu prompts vào config trên worker thread (không block UI)."""
+        self._io_pool.submit(self.config.set, "video_manual_prompts", prompts)
+    
+    def _set_button_states(self, start_enabled: bool, stop_enabled: bool):
+        """Cập nhật trạng thái nút Bắt Đầu/Dừng, chỉ configure khi thay đổi."""
+        if start_enabled != self._start_enabled:
+            self._start_enabled = start_enabled
+            self._start_btn.configure(state=NORMAL if start_enabled else DISABLED)
+        
+        if stop_enabled != self._stop_enabled:
+            self._stop_enabled = stop_enabled
+            self._stop_btn.configure(state=NORMAL if stop_enabled else DISABLED)
+    
+    def _set_status(self, text: str):
+        """Cập nhật status label, bỏ qua nếu text không đổi."""
+        if text != self._status_text:
+            self._status_text = text
+            # Label chưa tạo thì text sẽ được dùng khi tạo
+            if self._status_outer is not None:
+                self._status_label.configure(text=text)
     
     def _browse_folder(self):
         """Open folder browser."""
@@ -289,6 +386,7 @@ class VideoTab(ttk.Frame):
                 batch_size = self._batch_var.get()
             else:
                 # Manual mode: use prompt count as batch size
+                self._ensure_manual_prompts()
                 prompts = self._prompts_container.get_all_prompts()
                 batch_size = len(prompts)
                 
@@ -296,13 +394,15 @@ class VideoTab(ttk.Frame):
                     self.logger.error("Vui lòng thêm ít nhất 1 prompt")
                     return
                 
-                self.config.set("video_manual_prompts", prompts)
+                if self._save_after_id:
+                    self.after_cancel(self._save_after_id)
+                    self._save_after_id = None
+                self._save_prompts(prompts)
                 self.logger.info(f"Sử dụng {batch_size} prompt thủ công")
             
             self._running = True
-            self._start_btn.configure(state=DISABLED)
-            self._stop_btn.configure(state=NORMAL)
-            self._status_label.configure(text="Đang chạy...")
+            self._set_button_states(False, True)
+            self._set_status("Đang chạy...")
             
             self._on_start("video", {
                 "mode": self._mode_var.get(),
@@ -316,12 +416,28 @@ class VideoTab(ttk.Frame):
         """Handle stop button click."""
         if self._on_stop:
             self._running = False
-            self._stop_btn.configure(state=DISABLED)
-            self._status_label.configure(text="Đang dừng...")
+            self._set_button_states(self._start_enabled, False)
+            self._set_status("Đang dừng...")
             self._on_stop()
     
+    def _defer_to_ui(self, func, *args) -> bool:
+        """
+        Chuyển lời gọi về Tk main thread nếu đang ở worker thread.
+        
+        Returns:
+            True nếu đã lên lịch qua after_idle (caller nên return ngay)
+        """
+        if threading.current_thread() is threading.main_thread():
+            return False
+        self.after_idle(func, *args)
+        return True
+    
     def update_progress(self, current: int, total: int):
         """Update progress bar."""
+        if self._defer_to_ui(self.update_progress, current, total):
+            return
+        
+        self._ensure_status_frame()
         if total > 0:
             percent = (current / total) * 100
             self._progress_var.set(percent)
@@ -330,21 +446,28 @@ class VideoTab(ttk.Frame):
     
     def update_status(self, status: str):
         """Update status label."""
-        self._status_label.configure(text=status)
+        if self._defer_to_ui(self.update_status, status):
+            return
+        
+        self._set_status(status)
     
     def on_complete(self):
         """Called when generation is complete."""
+        if self._defer_to_ui(self.on_complete):
+            return
+        
         self._running = False
-        self._start_btn.configure(state=NORMAL)
-        self._stop_btn.configure(state=DISABLED)
-        self._status_label.configure(text="Hoàn thành")
+        self._set_button_states(True, False)
+        self._set_status("Hoàn thành")
     
     def on_error(self, message: str):
         """Called on error."""
+        if self._defer_to_ui(self.on_error, message):
+            return
+        
         self._running = False
-        self._start_btn.configure(state=NORMAL)
-        self._stop_btn.configure(state=DISABLED)
-        self._status_label.configure(text=f"Lỗi: {message}")
+        self._set_button_states(True, False)
+        self._set_status(f"Lỗi: {message}")
     
     def set_buttons_enabled(self, enabled: bool, allow_stop: bool = False):
         """
@@ -355,11 +478,6 @@ class VideoTab(ttk.Frame):
             allow_stop: If True and enabled=False, keep stop button enabled
         """
         if enabled:
-            self._start_btn.configure(state=NORMAL)
-            self._stop_btn.configure(state=DISABLED)
+            self._set_button_states(True, False)
         else:
-            self._start_btn.configure(state=DISABLED)
-            if allow_stop:
-                self._stop_btn.configure(state=NORMAL)
-            else:
-                self._stop_btn.configure(state=DISABLED)
+            self._set_button_states(False, allow_stop)
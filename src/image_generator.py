@@ -1,8 +1,10 @@
 """
 Image Generator - Orchestrate image generation workflow
 """
+import queue
 import time
 import threading
+import traceback
 from typing import Optional, Callable
 from pathlib import Path
 
@@ -16,6 +18,9 @@ from .logger import get_logger
 class ImageGenerator:
     """Orchestrate the image generation workflow."""
     
+    # Khoảng tối thiểu giữa hai lần gửi progress (giây)
+    PROGRESS_INTERVAL = 0.1
+    
     def __init__(self, browser: BrowserManager, on_progress: Optional[Callable] = None):
         """
         Initialize image generator.
@@ -32,15 +37,61 @@ class ImageGenerator:
         self.on_progress = on_progress
         
         self._running = False
-        self._stop_requested = False
+        self._stop_event = threading.Event()
+        self._last_progress_ts = 0.0
+        # Cập nhật bị gộp gần nhất, gửi bù khi hết khoảng throttle
+        self._progress_lock = threading.Lock()
+        self._pending_progress: Optional[tuple] = None
+        self._progress_timer: Optional[threading.Timer] = None
+        self._images_dir: Optional[Path] = None
+        # Hàng đợi prompt: luồng producer tạo trước prompt trong lúc chờ ảnh
+        self._prompt_queue: Optional[queue.Queue] = None
+        self._prompt_thread: Optional[threading.Thread] = None
+        self._prompt_done: Optional[threading.Event] = None
     
     def _update_progress(self, current: int, total: int, status: str):
-        """Update progress via callback."""
-        if self.on_progress:
+        """
+        Update progress via callback (tối đa ~10 lần/giây).
+        
+        Cập nhật rơi vào khoảng throttle không bị bỏ: bản mới nhất được gửi
+        bù khi hết khoảng, nên UI luôn hiển thị trạng thái cuối cùng.
+        """
+        with self._progress_lock:
+            now = time.monotonic()
+            wait = self.PROGRESS_INTERVAL - (now - self._last_progress_ts)
+            if status != "Hoàn thành" and wait > 0:
+                self._pending_progress = (current, total, status)
+                if self._progress_timer is None:
+                    self._progress_timer = threading.Timer(wait, self._flush_progress)
+                    self._progress_timer.daemon = True
+                    self._progress_timer.start()
+                return
+            # Gửi ngay: bản đang chờ đã cũ hơn
+            self._pending_progress = None
+            self._last_progress_ts = now
+            self._emit_progress(current, total, status)
+    
+    def _flush_progress(self):
+        """Gửi bù cập nhật progress bị gộp gần nhất (chạy trên Timer)."""
+        with self._progress_lock:
+            self._progress_timer = None
+            pending = self._pending_progress
+            if pending is None:
+                return
+            self._pending_progress = None
+            self._last_progress_ts = time.monotonic()
+            self._emit_progress(*pending)
+    
+    def _emit_progress(self, current: int, total: int, status: str):
+        """Gọi callback progress (gọi khi đang giữ _progress_lock để giữ thứ tự)."""
+        # Callback lỗi sẽ được ghi log một lần rồi bị bỏ qua
+        on_progress = self.on_progress
+        if on_progress is not None:
             try:
-                self.on_progress(current, total, status)
+                on_progress(current, total, status)
             except Exception:
-                pass
+                self.logger.error(f"Lỗi callback progress:\n{traceback.format_exc()}")
+                self.on_progress = None
     
     def start(self, batch_count: int, auto_prompt: bool = True) -> bool:
         """
@@ -58,7 +109,11 @@ class ImageGenerator:
             return False
         
         self._running = True
-        self._stop_requested = False
+        self._stop_event.clear()
+        
+        if auto_prompt:
+            # Mở sẵn kết nối tới OpenRouter trong lúc vòng lặp khởi động
+            threading.Thread(target=self.prompt_gen.warmup, daemon=True).start()
         
         # Run in separate thread
         thread = threading.Thread(
@@ -72,118 +127,173 @@ class ImageGenerator:
     
     def stop(self):
         """Request to stop generation."""
-        self._stop_requested = True
+        self._stop_event.set()
         self.logger.info("Đang dừng...")
     
     def is_running(self) -> bool:
         """Check if generation is running."""
         return self._running
     
+    def _prompt_producer(self, count: int, prompt_queue: queue.Queue,
+                         done: threading.Event):
+        """Generate prompts ahead of the generation loop (producer thread)."""
+        stop_event = self._stop_event
+        for _ in range(count):
+            if stop_event.is_set() or done.is_set():
+                return
+            prompts = self.prompt_gen.generate_prompts()
+            # Chờ chỗ trống trong hàng đợi, vẫn kiểm tra yêu cầu dừng
+            while not (stop_event.is_set() or done.is_set()):
+                try:
+                    prompt_queue.put(prompts, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+    
+    def _start_prompt_producer(self, count: int) -> queue.Queue:
+        """Start the prompt producer thread and return its queue."""
+        self._prompt_queue = queue.Queue(maxsize=2)
+        self._prompt_done = threading.Event()
+        self._prompt_thread = threading.Thread(
+            target=self._prompt_producer,
+            args=(count, self._prompt_queue, self._prompt_done),
+            name="PromptProducer",
+            daemon=True
+        )
+        self._prompt_thread.start()
+        return self._prompt_queue
+    
+    def _next_prompts(self, prompt_queue: queue.Queue) -> Optional[dict]:
+        """Take the next prepared prompt set (None if stopped)."""
+        while not self._stop_event.is_set():
+            try:
+                return prompt_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+    
     def _generation_loop(self, batch_count: int, auto_prompt: bool = True):
         """Main generation loop."""
+        # Bind các thuộc tính dùng trong vòng lặp vào biến local
+        log = self.logger
+        log_info = log.info
+        log_error = log.error
+        info_enabled = log.is_enabled
+        grok = self.grok
+        enter_prompt = grok.enter_prompt
+        wait_input_ready = grok.wait_input_ready
+        submit_prompt = grok.submit_prompt
+        wait_for_images = grok.wait_for_images
+        stop_event = self._stop_event
+        is_stopped = stop_event.is_set
+        update = self._update_progress
+        
         try:
             # Get output directory
             images_dir = self.config.get_path("images_dir")
             if images_dir is None:
                 images_dir = Path("./images")
             images_dir.mkdir(parents=True, exist_ok=True)
+            self._images_dir = images_dir
             
             # Get delay between batches
             delay = self.config.get("delay_between_prompts", 5)
+            # Đọc timeout một lần thay vì mỗi batch
+            timeout = self.config.get("timeout_seconds", 60)
             
             # Get manual prompts if not using auto-prompt
             manual_prompts = []
             if not auto_prompt:
                 manual_prompts = self.config.get("manual_prompts", [])
                 if not manual_prompts:
-                    self.logger.error("Không có prompt thủ công nào được cấu hình")
+                    log.error("Không có prompt thủ công nào được cấu hình")
                     return
                 batch_count = len(manual_prompts)
-                self.logger.info(f"Sử dụng {batch_count} prompt thủ công")
+                log.info(f"Sử dụng {batch_count} prompt thủ công")
             
             total_downloaded = 0
             
+            prompt_queue = None
+            if auto_prompt:
+                prompt_queue = self._start_prompt_producer(batch_count)
+            
             for batch_idx in range(batch_count):
-                if self._stop_requested:
-                    self.logger.info("Đã dừng theo yêu cầu")
-                    break
-                
-                # Check for rate limit before proceeding
-                if self.grok.check_rate_limit():
-                    self.logger.error("Đã đạt rate limit - Dừng toàn bộ quá trình")
-                    self._stop_requested = True
+                if is_stopped():
+                    log_info("Đã dừng theo yêu cầu")
                     break
                 
-                self._update_progress(batch_idx, batch_count, f"Batch {batch_idx + 1}/{batch_count}")
+                update(batch_idx, batch_count, f"Batch {batch_idx + 1}/{batch_count}")
                 
                 # Get prompt based on mode
                 if auto_prompt:
                     # Generate prompt using OpenRouter
-                    self.logger.info(f"Đang tạo prompt tự động cho batch {batch_idx + 1}...")
-                    prompts = self.prompt_gen.generate_prompts()
+                    if info_enabled("INFO"):
+                        log_info(f"Đang tạo prompt tự động cho batch {batch_idx + 1}...")
+                    prompts = self._next_prompts(prompt_queue)
+                    if is_stopped():
+                        log_info("Đã dừng theo yêu cầu")
+                        break
                     
                     if not prompts:
-                        self.logger.error("Không thể tạo prompt, bỏ qua batch này")
+                        log_error("Không thể tạo prompt, bỏ qua batch này")
                         continue
                     
                     image_prompt = prompts.get("image_prompt", "")
                 else:
                     # Use manual prompt
                     image_prompt = manual_prompts[batch_idx]
-                    self.logger.info(f"Sử dụng prompt thủ công {batch_idx + 1}/{batch_count}")
+                    if info_enabled("INFO"):
+                        log_info(f"Sử dụng prompt thủ công {batch_idx + 1}/{batch_count}")
                 
                 if not image_prompt:
-                    self.logger.error("Prompt ảnh trống, bỏ qua")
+                    log_error("Prompt ảnh trống, bỏ qua")
                     continue
                 
-                self.logger.info(f"Prompt: {image_prompt[:100]}...")
+                if info_enabled("INFO"):
+                    log_info(f"Prompt: {image_prompt[:100]}...")
                 
                 # Enter prompt
-                if not self.grok.enter_prompt(image_prompt):
-                    self.logger.error("Không thể nhập prompt, bỏ qua batch này")
+                if not enter_prompt(image_prompt):
+                    log_error("Không thể nhập prompt, bỏ qua batch này")
                     continue
                 
                 # Submit
-                time.sleep(0.5)  # Small delay before submit
-                if not self.grok.submit_prompt():
-                    self.logger.error("Không thể gửi prompt, bỏ qua batch này")
+                wait_input_ready(0.5)
+                if not submit_prompt():
+                    log_error("Không thể gửi prompt, bỏ qua batch này")
                     continue
                 
                 # Wait for images (sẽ tự tải ảnh và xử lý rate limit)
-                result = self.grok.wait_for_images(min_count=1)
+                result = wait_for_images(timeout=timeout, min_count=1, target_dir=images_dir)
                 
-                # Xử lý kết quả: có thể là số ảnh, tuple (số ảnh, "rate_limit"), hoặc False
-                if isinstance(result, tuple):
-                    # Rate limit detected after downloading
-                    downloaded_count, status = result
-                    total_downloaded += downloaded_count
-                    if status == "rate_limit":
-                        self.logger.error("Đã đạt rate limit - Dừng toàn bộ quá trình")
-                        self._stop_requested = True
-                        break
-                elif isinstance(result, int):
-                    # Số ảnh đã tải
-                    total_downloaded += result
-                    if result == 0:
-                        self.logger.error("Không có ảnh nào được tạo, bỏ qua batch này")
-                        continue
-                elif not result:
-                    self.logger.error("Không có ảnh nào được tạo, bỏ qua batch này")
+                total_downloaded += result.downloaded
+                if result.rate_limited:
+                    log_error("Đã đạt rate limit - Dừng toàn bộ quá trình")
+                    stop_event.set()
+                    break
+                if result.downloaded == 0:
+                    log_error("Không có ảnh nào được tạo, bỏ qua batch này")
                     continue
                 
                 # Delay before next batch
-                if batch_idx < batch_count - 1 and not self._stop_requested:
-                    self.logger.info(f"Chờ {delay}s trước batch tiếp theo...")
-                    for _ in range(delay):
-                        if self._stop_requested:
-                            break
-                        time.sleep(1)
+                if batch_idx < batch_count - 1 and not is_stopped():
+                    if info_enabled("INFO"):
+                        log_info(f"Chờ {delay}s trước batch tiếp theo...")
+                    # Trả về ngay khi có yêu cầu dừng
+                    if stop_event.wait(delay):
+                        break
             
-            self._update_progress(batch_count, batch_count, "Hoàn thành")
-            self.logger.success(f"Hoàn thành tất cả! Tổng cộng {total_downloaded} ảnh từ {batch_count} batch")
+            update(batch_count, batch_count, "Hoàn thành")
+            log.success(f"Hoàn thành tất cả! Tổng cộng {total_downloaded} ảnh từ {batch_count} batch")
             
         except Exception as e:
-            self.logger.error(f"Lỗi trong quá trình tạo ảnh: {e}")
+            log.error(f"Lỗi trong quá trình tạo ảnh: {e}")
         finally:
+            if self._prompt_thread is not None:
+                # Producer có thể đang chờ API, không chặn quá lâu
+                self._prompt_done.set()
+                self._prompt_thread.join(timeout=1)
+                self._prompt_thread = None
+                self._prompt_queue = None
             self._running = False
-            self._stop_requested = False
+            self._stop_event.clear()
@@ -1,10 +1,16 @@
 """
 Logger - Thread-safe logging with GUI and file output
 """
+import functools
+import gzip
 import logging
 import os
 import queue
+import shutil
+import sys
 import threading
+import time
+import traceback
 from datetime import datetime
 from pathlib import Path
 from typing import Callable, Optional
@@ -13,6 +19,20 @@ from typing import Callable, Optional
 class ThreadLogger:
     """Thread-safe logger with per-thread prefix and GUI callback."""
 
+    # Levels that are always logged, regardless of verbose
+    ALWAYS_LEVELS = frozenset({"WARN", "ERROR", "OK"})
+
+    # File buffering: flush when buffer exceeds this size or interval elapses
+    FLUSH_BYTES = 8192
+    FLUSH_INTERVAL = 0.5
+
+    # Start a new part file when the session log grows past this size
+    MAX_LOG_BYTES = 10 * 1024 * 1024
+
+    # Logs modified more recently than this may still be open (another
+    # instance, or a logger replaced by init_logger) and are left alone
+    COMPRESS_MIN_AGE = 300
+
     def __init__(self,
                  log_dir: str = None,
                  gui_callback: Optional[Callable[[str], None]] = None,
@@ -25,8 +45,6 @@ class ThreadLogger:
             gui_callback: Callback function to send logs to GUI
             verbose: Enable verbose logging
         """
-        import sys
-
         if log_dir is None:
             # Auto-detect log directory
             if getattr(sys, 'frozen', False):
@@ -46,35 +64,199 @@ class ThreadLogger:
 
         self.gui_callback = gui_callback
         self.verbose = verbose
-        self._lock = threading.Lock()
-        self._log_queue = queue.Queue()
+        # Console output as raw bytes (None when there is no console)
+        self._stdout = getattr(sys.stdout, "buffer", None)
+        # Producers only enqueue; the LogWriter thread does all the output
+        self._log_queue = queue.SimpleQueue()
+
+        # Pending file output, written in batches by flush()
+        self._buffer = bytearray()
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._compress_lock = threading.Lock()
+
+        # Formatting caches: timestamp per second, prefix per thread
+        self._ts_cache = (0, "")
+        self._thread_local = threading.local()
 
         # Create log file for this session
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = self.log_dir / f"session_{timestamp}.log"
+        self._session_name = f"session_{timestamp}"
+        self._log_part = 1
+        self.log_file = self.log_dir / f"{self._session_name}.log"
 
         # Setup file handler
         self._setup_file_handler()
 
+        # Compress logs from previous sessions in the background
+        self._start_compress_old_logs()
+
     def _setup_file_handler(self):
-        """Setup file logging."""
-        self._file = open(self.log_file, 'a', encoding='utf-8')
+        """Setup file logging and the writer thread."""
+        # Unbuffered binary file: flush() writes each batch with one syscall
+        self._file = open(self.log_file, 'ab', buffering=0)
+        self._file_size = self.log_file.stat().st_size
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop,
+            name="LogWriter",
+            daemon=True
+        )
+        self._writer_thread.start()
+
+    def _writer_loop(self):
+        """Drain queued records to file, GUI and console (single consumer)."""
+        log_queue = self._log_queue
+        while True:
+            try:
+                records = [log_queue.get(timeout=self.FLUSH_INTERVAL)]
+            except queue.Empty:
+                # Flush partial buffers periodically
+                self.flush()
+                continue
+
+            # Take everything already queued so it is written as one batch
+            while True:
+                try:
+                    records.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in records
+            if stop:
+                records = [r for r in records if r is not None]
+            if records:
+                self._write_records(records)
+            if stop:
+                return
+
+    def _write_records(self, records: list):
+        """Write a batch of (level, formatted) records."""
+        lines = [formatted for _, formatted in records]
+        data = ("\n".join(lines) + "\n").encode("utf-8", "replace")
+
+        with self._buffer_lock:
+            self._buffer.extend(data)
+            # Errors are written out immediately
+            need_flush = (any(level == "ERROR" for level, _ in records)
+                          or len(self._buffer) > self.FLUSH_BYTES
+                          or time.monotonic() - self._last_flush > self.FLUSH_INTERVAL)
+        if need_flush:
+            self.flush()
+
+        # Send to GUI (a failing callback is reported once, then dropped)
+        callback = self.gui_callback
+        if callback is not None:
+            try:
+                for line in lines:
+                    # Cleared by close(): stop calling into the GUI mid-batch
+                    if self.gui_callback is None:
+                        break
+                    callback(line)
+            except Exception:
+                self.gui_callback = None
+                if sys.stderr is not None:
+                    sys.stderr.write(traceback.format_exc())
+
+        # Also write to console (same bytes as the file, one write per batch)
+        if self._stdout is not None:
+            try:
+                self._stdout.write(data)
+                self._stdout.flush()
+            except (BrokenPipeError, ValueError, OSError):
+                self._stdout = None
+
+    def flush(self):
+        """Write buffered log lines to the log file."""
+        with self._flush_lock:
+            with self._buffer_lock:
+                if not self._buffer:
+                    return
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                self._last_flush = time.monotonic()
+            try:
+                fd = self._file.fileno()
+                view = memoryview(data)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+                    self._file_size += written
+            except (OSError, ValueError):
+                return
+
+            if self._file_size > self.MAX_LOG_BYTES:
+                self._rotate()
+
+    def _rotate(self):
+        """Switch to a new part file (called with the flush lock held)."""
+        self._log_part += 1
+        new_file = self.log_dir / f"{self._session_name}_part{self._log_part}.log"
+        try:
+            handle = open(new_file, 'ab', buffering=0)
+        except OSError:
+            return
+        self._file.close()
+        self._file = handle
+        self._file_size = 0
+        self.log_file = new_file
+        # Finished parts keep the session prefix, so the next session compresses them
+
+    def _start_compress_old_logs(self):
+        """Compress old log files on a background thread."""
+        threading.Thread(
+            target=self._compress_old_logs,
+            name="LogCompress",
+            daemon=True
+        ).start()
+
+    def _compress_old_logs(self):
+        """Gzip session logs from earlier sessions that are no longer written."""
+        with self._compress_lock:
+            cutoff = time.time() - self.COMPRESS_MIN_AGE
+            for path in self.log_dir.glob("session_*.log"):
+                # Current session (any part) or recently written: may be in use
+                if path == self.log_file or path.name.startswith(self._session_name):
+                    continue
+                try:
+                    if path.stat().st_mtime > cutoff:
+                        continue
+                except OSError:
+                    continue
+                gz_path = path.with_name(path.name + ".gz")
+                try:
+                    with open(path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+                        shutil.copyfileobj(src, dst)
+                    path.unlink()
+                except OSError:
+                    # File may still be open by another instance
+                    try:
+                        gz_path.unlink()
+                    except OSError:
+                        pass
 
     def _get_thread_prefix(self) -> str:
-        """Get current thread prefix."""
-        thread_name = threading.current_thread().name
-        if thread_name.startswith("Thread-"):
-            return f"[{thread_name}]"
-        elif thread_name == "MainThread":
-            return "[Main]"
-        else:
-            return f"[{thread_name}]"
+        """Get current thread prefix (computed once per thread)."""
+        prefix = getattr(self._thread_local, "prefix", None)
+        if prefix is None:
+            thread_name = threading.current_thread().name
+            if thread_name == "MainThread":
+                prefix = "[Main]"
+            else:
+                prefix = f"[{thread_name}]"
+            self._thread_local.prefix = prefix
+        return prefix
 
     def _format_message(self, level: str, message: str) -> str:
         """Format log message with timestamp and thread."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        prefix = self._get_thread_prefix()
-        return f"{timestamp} {prefix} [{level}] {message}"
+        now = int(time.time())
+        cached_second, timestamp = self._ts_cache
+        if now != cached_second:
+            timestamp = time.strftime("%H:%M:%S", time.localtime(now))
+            self._ts_cache = (now, timestamp)
+        # f-string is faster than a "%s %s [%s] %s" template on CPython 3.11+
+        # (BUILD_STRING does a single allocation)
+        return f"{timestamp} {self._get_thread_prefix()} [{level}] {message}"
 
     def _log(self, level: str, message: str, force: bool = False):
         """Internal log method."""
@@ -82,21 +264,18 @@ class ThreadLogger:
             return
 
         formatted = self._format_message(level, message)
+        self._log_queue.put((level, formatted))
 
-        with self._lock:
-            # Write to file
-            self._file.write(formatted + "\n")
-            self._file.flush()
+    def is_enabled(self, level: str) -> bool:
+        """
+        Check if messages of a level would be logged.
 
-            # Send to GUI
-            if self.gui_callback:
-                try:
-                    self.gui_callback(formatted)
-                except Exception:
-                    pass
+        Use to skip building expensive messages when verbose is off.
 
-            # Also print to console
-            print(formatted)
+        Args:
+            level: Level name ("INFO", "DEBUG", "WARN", "ERROR", "OK")
+        """
+        return self.verbose or level.upper() in self.ALWAYS_LEVELS
 
     def info(self, message: str):
         """Log info message."""
@@ -127,8 +306,18 @@ class ThreadLogger:
         self.gui_callback = callback
 
     def close(self):
-        """Close log file."""
+        """Flush pending lines and close log file."""
         if hasattr(self, '_file') and self._file:
+            # No GUI calls during shutdown: close() may run on the Tk main
+            # thread, which cannot serve the callback while it waits below
+            self.gui_callback = None
+            # Let the writer drain everything queued before closing
+            self._log_queue.put(None)
+            self._writer_thread.join(timeout=2)
+            if self._writer_thread.is_alive():
+                # Writer still running: never close the file underneath it
+                return
+            self.flush()
             self._file.close()
 
 
@@ -136,8 +325,14 @@ class ThreadLogger:
 _logger_instance = None
 
 
+@functools.lru_cache(maxsize=1)
 def get_logger() -> ThreadLogger:
-    """Get global logger instance."""
+    """
+    Get global logger instance.
+
+    Cached: returns the same shared ThreadLogger until init_logger()
+    replaces it (init_logger clears the cache).
+    """
     global _logger_instance
     if _logger_instance is None:
         _logger_instance = ThreadLogger()
@@ -150,4 +345,5 @@ def init_logger(log_dir: str = None,
     """Initialize global logger with custom settings."""
     global _logger_instance
     _logger_instance = ThreadLogger(log_dir, gui_callback, verbose)
+    get_logger.cache_clear()
     return _logger_instance
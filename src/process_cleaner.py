@@ -2,10 +2,10 @@
 Process Cleaner - Kill orphan Chrome processes
 """
 import os
-import signal
-import subprocess
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+
+import psutil
 
 from .logger import get_logger
 
@@ -13,26 +13,56 @@ from .logger import get_logger
 class ProcessCleaner:
     """Manage and cleanup Chrome processes."""
     
+    # Process name fragments accepted as ours (chrome, chromedriver, chromium)
+    CHROME_NAME_MARKERS = ("chrome", "chromium")
+    
     def __init__(self, pids_file: str = "./chrome_pids.txt"):
         """Initialize process cleaner."""
         self.pids_file = Path(pids_file)
         self.logger = get_logger()
         self._current_pids: List[int] = []
+        # File descriptor kept open for PID writes (opened on first save)
+        self._pids_fd: Optional[int] = None
     
     def save_pid(self, pid: int):
         """Save a Chrome PID to track."""
         self._current_pids.append(pid)
-        self._save_pids_to_file()
+        self._append_pid(pid)
+    
+    def _append_pid(self, pid: int):
+        """Append a single PID line to the file."""
+        if self._pids_fd is None:
+            # First write: rewrite the file so stale PIDs are dropped
+            self.flush_all()
+            return
+        try:
+            os.write(self._pids_fd, f"{pid}\n".encode())
+        except OSError as e:
+            self.logger.error(f"Không thể lưu PIDs: {e}")
     
-    def _save_pids_to_file(self):
-        """Save all current PIDs to file."""
+    def flush_all(self):
+        """Rewrite the PIDs file with all current PIDs (compaction)."""
+        buf = "".join(f"{pid}\n" for pid in self._current_pids).encode()
         try:
-            with open(self.pids_file, 'w') as f:
-                for pid in self._current_pids:
-                    f.write(f"{pid}\n")
-        except IOError as e:
+            if self._pids_fd is None:
+                self._pids_fd = os.open(str(self.pids_file), os.O_RDWR | os.O_CREAT, 0o644)
+            # Rewrite in place; the offset stays at the end for later appends
+            # (lseek + write instead of pwrite, which Windows lacks)
+            os.lseek(self._pids_fd, 0, os.SEEK_SET)
+            os.write(self._pids_fd, buf)
+            os.ftruncate(self._pids_fd, len(buf))
+        except OSError as e:
             self.logger.error(f"Không thể lưu PIDs: {e}")
     
+    def _close_file_handle(self):
+        """Close the PIDs file descriptor if open."""
+        if self._pids_fd is not None:
+            try:
+                os.close(self._pids_fd)
+            except OSError:
+                pass
+            self._pids_fd = None
+    
     def _load_pids_from_file(self) -> List[int]:
         """Load PIDs from file."""
         pids = []
@@ -57,10 +87,14 @@ class ProcessCleaner:
         
         self.logger.info(f"Tìm thấy {len(old_pids)} tiến trình Chrome còn sót")
         
-        killed = 0
-        for pid in old_pids:
-            if self._kill_process(pid):
-                killed += 1
+        # PIDs may have been reused after a crash/reboot: only processes
+        # started before the file was last written can be the ones saved
+        try:
+            started_before = self.pids_file.stat().st_mtime
+        except OSError:
+            started_before = None
+        
+        killed = self._kill_processes(old_pids, started_before)
         
         if killed > 0:
             self.logger.success(f"Đã dọn dẹp {killed} tiến trình Chrome")
@@ -68,34 +102,72 @@ class ProcessCleaner:
         # Clear the file
         self._clear_pids_file()
     
+    def _is_own_chrome(self, proc: psutil.Process, started_before: Optional[float]) -> bool:
+        """Check a saved PID still belongs to a Chrome/chromedriver we started."""
+        name = proc.name().lower()
+        if not any(marker in name for marker in self.CHROME_NAME_MARKERS):
+            return False
+        # 1s slack: create_time and file mtime have different precision
+        if started_before is not None and proc.create_time() > started_before + 1:
+            return False
+        return True
+    
+    def _kill_processes(self, pids: List[int], started_before: Optional[float] = None) -> int:
+        """
+        Kill several processes at once.
+        
+        Terminates all of them first, then waits for them together,
+        without per-PID logging. PIDs that now belong to another program
+        (not Chrome, or started after started_before) are left alone.
+        
+        Returns:
+            Number of processes killed
+        """
+        procs = []
+        for pid in pids:
+            try:
+                proc = psutil.Process(pid)
+                if not self._is_own_chrome(proc, started_before):
+                    continue
+                proc.terminate()
+                procs.append(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                # Process doesn't exist or access denied
+                pass
+        
+        if not procs:
+            return 0
+        
+        gone, alive = psutil.wait_procs(procs, timeout=2)
+        for proc in alive:
+            try:
+                proc.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return len(procs)
+    
     def _kill_process(self, pid: int) -> bool:
         """Kill a process by PID."""
         try:
-            # Check if process exists
-            if os.name == 'nt':  # Windows
-                # Use taskkill on Windows
-                result = subprocess.run(
-                    ['taskkill', '/F', '/PID', str(pid)],
-                    capture_output=True,
-                    text=True
-                )
-                if result.returncode == 0:
-                    self.logger.debug(f"Đã dừng tiến trình {pid}")
-                    return True
-                else:
-                    # Process might not exist anymore
-                    return False
-            else:  # Unix
-                os.kill(pid, signal.SIGTERM)
-                self.logger.debug(f"Đã dừng tiến trình {pid}")
-                return True
-        except (OSError, subprocess.SubprocessError):
-            # Process doesn't exist or access denied
+            proc = psutil.Process(pid)
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except psutil.TimeoutExpired:
+                # Did not exit on terminate: force it
+                proc.kill()
+                proc.wait(timeout=2)
+            self.logger.debug(f"Đã dừng tiến trình {pid}")
+            return True
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
+            # Process doesn't exist, access denied or still running
             return False
     
     def _clear_pids_file(self):
         """Clear the PIDs file."""
         self._current_pids = []
+        # Close before unlink (required on Windows)
+        self._close_file_handle()
         if self.pids_file.exists():
             try:
                 self.pids_file.unlink()
@@ -103,27 +175,20 @@ class ProcessCleaner:
                 pass
     
     def kill_all_chromedriver(self) -> int:
-        """Kill all chromedriver.exe processes."""
+        """Kill all chromedriver processes."""
         killed = 0
         
-        if os.name == 'nt':  # Windows
-            try:
-                result = subprocess.run(
-                    ['taskkill', '/F', '/IM', 'chromedriver.exe'],
-                    capture_output=True,
-                    text=True
-                )
-                if 'SUCCESS' in result.stdout:
-                    self.logger.info("Đã dừng tất cả chromedriver.exe")
-                    killed = 1
-            except subprocess.SubprocessError as e:
-                self.logger.error(f"Không thể dừng chromedriver: {e}")
-        else:
-            try:
-                subprocess.run(['pkill', '-f', 'chromedriver'], capture_output=True)
-                killed = 1
-            except subprocess.SubprocessError:
-                pass
+        for proc in psutil.process_iter(['name']):
+            name = proc.info['name']
+            if name and 'chromedriver' in name.lower():
+                try:
+                    proc.kill()
+                    killed += 1
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+        
+        if killed > 0:
+            self.logger.info(f"Đã dừng {killed} tiến trình chromedriver")
         
         return killed
     
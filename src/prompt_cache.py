@@ -0,0 +1,144 @@
+"""
+Prompt Cache - Local cache of generated prompts (memory LRU + SQLite)
+"""
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+
+from .config import get_config
+from .logger import get_logger
+
+
+# Cache file (stored next to config.json)
+PROMPT_CACHE_FILENAME = "prompts_cache.db"
+
+
+class PromptCache:
+    """Two-level prompt cache: in-memory LRU in front of a SQLite table."""
+
+    def __init__(self, db_path: Path, max_entries: int = 256, ttl_seconds: float = 7 * 24 * 3600):
+        """
+        Initialize prompt cache.
+
+        Args:
+            db_path: SQLite database file (opened on first use)
+            max_entries: Max entries kept in memory
+            ttl_seconds: Entries older than this are treated as misses
+        """
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.logger = get_logger()
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, style: str, location: str, ethnicity: str) -> str:
+        """Build cache key from model and chosen variations."""
+        raw = f"{model}|{style}|{location}|{ethnicity}"
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _get_conn(self) -> Optional[sqlite3.Connection]:
+        """Open the database on first use (None if unavailable)."""
+        if self._conn is None:
+            try:
+                conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS prompts ("
+                    "key TEXT PRIMARY KEY, response_json TEXT, created_at INT)"
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                self.logger.warning(f"Không thể mở cache prompt: {e}")
+                return None
+        return self._conn
+
+    def _remember(self, key: str, value: Dict[str, str], created_at: float):
+        """Put an entry in the memory LRU (caller holds the lock)."""
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """Return cached prompts for key, or None on miss/expired."""
+        min_created = time.time() - self.ttl_seconds
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if created_at >= min_created:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+            conn = self._get_conn()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT response_json, created_at FROM prompts "
+                    "WHERE key = ? AND created_at >= ?",
+                    (key, int(min_created))
+                ).fetchone()
+            except sqlite3.Error as e:
+                self.logger.debug(f"Lỗi đọc cache prompt: {e}")
+                return None
+            if row is None:
+                return None
+            try:
+                value = json.loads(row[0])
+            except json.JSONDecodeError:
+                return None
+            self._remember(key, value, row[1])
+            return value
+
+    def set(self, key: str, value: Dict[str, str]):
+        """Store prompts in memory and on disk."""
+        now = int(time.time())
+        with self._lock:
+            self._remember(key, value, now)
+            conn = self._get_conn()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO prompts (key, response_json, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                self.logger.debug(f"Lỗi ghi cache prompt: {e}")
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+@functools.lru_cache(maxsize=1)
+def get_prompt_cache() -> PromptCache:
+    """
+    Get global prompt cache instance.
+
+    Shared by all PromptGenerator instances so the memory layer is not
+    duplicated per generator.
+    """
+    config = get_config()
+    ttl_hours = config.get("prompt_cache_ttl_hours", 168)
+    return PromptCache(
+        config.config_path.parent / PROMPT_CACHE_FILENAME,
+        ttl_seconds=ttl_hours * 3600
+    )
@@ -1,12 +1,27 @@
 """
 Prompt Generator - OpenRouter API client for generating prompts
 """
+import itertools
 import json
+import random
+import re
+import threading
+import time
+from collections import deque
+
 import requests
-from typing import Optional, Dict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Iterator, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional, faster JSON parsing
+    orjson = None
 
 from .config import get_config
 from .logger import get_logger
+from .prompt_cache import get_prompt_cache
 
 
 # Hardcoded system prompt for sexy dance video generation
@@ -54,35 +69,273 @@ OUTPUT FORMAT (JSON):
 
 Only output the JSON, nothing else."""
 
+# Model families that need an explicit cache_control breakpoint for prompt
+# caching on OpenRouter (others cache the static prefix automatically)
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+# System messages, built once and shared by every request (never mutated)
+_SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+_SYSTEM_MESSAGE_CACHED = {
+    "role": "system",
+    "content": [{
+        "type": "text",
+        "text": SYSTEM_PROMPT,
+        "cache_control": {"type": "ephemeral"}
+    }]
+}
+
+# User message; only these few lines change between requests
+_USER_MESSAGE_TEMPLATE = """Generate a completely NEW and UNIQUE set of prompts.
+        
+Random seed: {seed}-{timestamp}
+Style direction: {style}
+Location: {location}
+Ethnicity: {ethnicity}
+
+Make this generation DIFFERENT from any previous ones. Be creative and surprising!"""
+
+# Static request fields (model and messages are added per call)
+_BASE_PAYLOAD = {
+    "temperature": 1.0,  # Increased for more randomness
+    "max_tokens": 1000
+}
+
+# Random style/theme variations to encourage diversity (picked per call)
+STYLES = (
+    # Phong cách kinh điển & quyến rũ
+    "elegant and classy lingerie goddess",
+    "wild and untamed sex kitten",
+    "sweet and innocent but dangerously seductive",
+    "mysterious dark femme fatale",
+    "playful teasing little devil",
+    "confident dominant queen energy",
+    "shy but extremely horny",
+    "fierce and powerful dominatrix vibes",
+    "soft romantic bedroom eyes",
+    "naughty schoolgirl gone bad",
+    "mature experienced seductress",
+    "athletic toned gym bombshell",
+
+    # Phong cách nóng bỏng hơn, táo bạo
+    "slutty and proud of it",
+    "dripping wet and needy",
+    "cum-hungry bedroom stare",
+    "bound and begging",
+    "just-fucked messy hair glow",
+    "oiled up glistening skin",
+    "spread wide and shameless",
+    "choking hazard throat",
+    "dripping honey sweet & filthy",
+    "corrupted angel fallen from grace",
+    "high-class escort premium service",
+    "backseat car quickie energy",
+
+    # Roleplay & fantasy nặng đô
+    "bunny girl with very short tail",
+    "naughty nurse ready to examine",
+    "strict teacher punishment time",
+    "maid who doesn't clean at all",
+    "succubus ready to drain you",
+    "vampire queen blood & lust",
+    "catgirl in extreme heat",
+    "office slut after hours",
+    "cheerleader with no panties",
+    "bride on her last wild night",
+    "police officer frisking you hard",
+    "japanese gravure idol wet shirt",
+
+    # Aesthetic & mood đặc trưng
+    "neon cyberpunk strip club",
+    "gothic victorian dark erotica",
+    "vaporwave pastel lewd",
+    "luxury sugar baby aesthetic",
+    "y2k trashy hot mess",
+    "e-girl onlyfans teaser",
+    "softcore morning after glow",
+    "hardcore BDSM dungeon queen",
+    "glamour pornstar red carpet",
+    "tropical vacation sex on the beach",
+    "winter fireplace slow sensual",
+    "sweaty summer midnight hookup",
+)
+
+LOCATIONS = (
+    "luxurious bedroom with silk sheets", "steamy bathroom with foggy mirror",
+    "beach cabana at sunset", "private pool with underwater lights",
+    "penthouse with city view at night", "studio with professional lighting",
+    "cozy living room by fireplace", "outdoor garden at golden hour",
+    "hotel room with mood lighting", "yacht deck under stars",
+)
+
+ETHNICITIES = (
+    "Asian", "Caucasian", "Latina", "mixed-race", "Eastern European",
+    "Mediterranean", "Nordic", "Middle Eastern", "African", "South Asian",
+)
+
+# Outermost JSON object in a response (skips code fences and any chatter)
+_JSON_OBJECT_RE = re.compile(r"\{.*\}", re.DOTALL)
+
+# Keys every generated prompt set must contain
+_REQUIRED_KEYS = frozenset(("image_prompt", "video1_prompt", "video2_prompt"))
+
+
+class _CappedRetry(Retry):
+    """Retry whose Retry-After wait is capped.
+    
+    The wait happens inside the request while a request slot is held, so an
+    unbounded server value would stall a worker (and Stop) for that long.
+    """
+    
+    MAX_RETRY_AFTER = 10.0
+    
+    def get_retry_after(self, response) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, self.MAX_RETRY_AFTER)
+
 
 class PromptGenerator:
     """Generate prompts using OpenRouter API."""
     
     OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
     
+    # How many recent styles are avoided when picking a new one
+    RECENT_STYLES = 8
+    
+    # HTTP session shared by all generators (keep-alive connection pool)
+    _shared_session: Optional[requests.Session] = None
+    # Round-robin over configured API keys (shared by all generators)
+    _key_cycle: Optional[Iterator[str]] = None
+    _key_cycle_keys: Tuple[str, ...] = ()
+    _session_lock = threading.Lock()
+    # Limits in-flight OpenRouter requests across all generators
+    _request_slots: Optional[threading.BoundedSemaphore] = None
+    
     def __init__(self):
         """Initialize prompt generator."""
         self.config = get_config()
         self.logger = get_logger()
+        # Own RNG so parallel generators don't share the module-level one
+        self._rng = random.Random()
+        # Styles picked recently, re-rolled once to cut down repetition
+        self._recent_styles = deque(maxlen=self.RECENT_STYLES)
+        self.reload_config()
+    
+    def reload_config(self):
+        """Re-read API keys and model from config (read once, not per call)."""
+        keys = [self.config.get("openrouter_api_key", "")]
+        keys.extend(self.config.get("openrouter_api_keys") or [])
+        self._api_keys: Tuple[str, ...] = tuple(dict.fromkeys(key for key in keys if key))
+        self._model: str = self.config.get("openrouter_model", "")
     
     def _get_api_key(self) -> str:
-        """Get OpenRouter API key from config."""
-        return self.config.get("openrouter_api_key", "")
+        """
+        Get the OpenRouter API key for the next request.
+        
+        ``openrouter_api_key`` plus any ``openrouter_api_keys`` are used in
+        turn, spreading parallel requests over several rate limits.
+        """
+        keys = self._api_keys
+        if len(keys) <= 1:
+            return keys[0] if keys else ""
+        
+        with PromptGenerator._session_lock:
+            if keys != PromptGenerator._key_cycle_keys:
+                PromptGenerator._key_cycle = itertools.cycle(keys)
+                PromptGenerator._key_cycle_keys = keys
+            return next(PromptGenerator._key_cycle)
+    
+    def _get_session(self) -> requests.Session:
+        """Get the shared HTTP session, creating it on first use."""
+        session = PromptGenerator._shared_session
+        if session is None:
+            with PromptGenerator._session_lock:
+                if PromptGenerator._shared_session is None:
+                    # In-flight requests are capped by the request semaphore,
+                    # so one connection per slot to the single OpenRouter host
+                    # is enough; pool_block reuses them instead of opening more
+                    pool_size = self._get_max_concurrency()
+                    session = requests.Session()
+                    session.mount("https://", HTTPAdapter(
+                        pool_connections=1,
+                        pool_maxsize=pool_size,
+                        pool_block=True,
+                        # Transient 429/5xx and connect failures are retried
+                        # (POST included) with jittered exponential backoff,
+                        # waiting out Retry-After on 429 (capped, see
+                        # _CappedRetry). Read timeouts are not: the request may
+                        # already be generating (and billed) on the server
+                        max_retries=_CappedRetry(
+                            total=3,
+                            connect=2,
+                            read=0,
+                            backoff_factor=0.5,
+                            backoff_jitter=0.5,
+                            status_forcelist=(429, 500, 502, 503, 504),
+                            allowed_methods=frozenset(("HEAD", "GET", "POST")),
+                            respect_retry_after_header=True,
+                            raise_on_status=False
+                        )
+                    ))
+                    PromptGenerator._shared_session = session
+                session = PromptGenerator._shared_session
+        return session
+    
+    def _get_max_concurrency(self) -> int:
+        """Get max number of concurrent OpenRouter requests."""
+        return max(1, int(self.config.get("openrouter_max_concurrency", 4)))
     
-    def _get_model(self) -> str:
-        """Get OpenRouter model from config."""
-        return self.config.get("openrouter_model", "")
+    def _get_request_slots(self) -> threading.BoundedSemaphore:
+        """Get the semaphore that caps concurrent OpenRouter requests."""
+        slots = PromptGenerator._request_slots
+        if slots is None:
+            with PromptGenerator._session_lock:
+                if PromptGenerator._request_slots is None:
+                    PromptGenerator._request_slots = threading.BoundedSemaphore(
+                        self._get_max_concurrency()
+                    )
+                slots = PromptGenerator._request_slots
+        return slots
+    
+    def _request_headers(self, api_key: str) -> dict:
+        """Per-request headers (the key can differ between requests)."""
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
     
-    def generate_prompts(self) -> Optional[Dict[str, str]]:
+    def warmup(self):
         """
-        Generate image and video prompts.
+        Open a keep-alive connection to OpenRouter ahead of the first call.
         
-        Returns:
-            Dict with keys: image_prompt, video1_prompt, video2_prompt
-            or None if failed
+        Fire-and-forget: failures are ignored.
+        """
+        models_url = self.OPENROUTER_URL.replace("/chat/completions", "/models")
+        try:
+            self._get_session().head(models_url, timeout=5)
+        except requests.RequestException:
+            pass
+    
+    def _log_api_error(self, response: requests.Response):
+        """Log a non-200 response as one line (body truncated)."""
+        self.logger.error(f"OpenRouter API lỗi {response.status_code}: {response.text[:500]}")
+    
+    def _build_system_message(self, model: str) -> dict:
         """
+        Build the system message.
+
+        SYSTEM_PROMPT is kept byte-identical and always first so the provider
+        can reuse its cached prefix; all randomization goes in the user message.
+        """
+        if model.startswith(CACHE_CONTROL_MODEL_PREFIXES):
+            return _SYSTEM_MESSAGE_CACHED
+        return _SYSTEM_MESSAGE
+    
+    def _check_settings(self) -> Optional[Tuple[str, str]]:
+        """Return (api_key, model), or None (logged) if not configured."""
         api_key = self._get_api_key()
-        model = self._get_model()
+        model = self._model
         
         if not api_key:
             self.logger.error("Chưa cấu hình OpenRouter API key")
@@ -92,135 +345,117 @@ class PromptGenerator:
             self.logger.error("Chưa cấu hình OpenRouter model")
             return None
         
-        self.logger.info(f"Đang tạo prompt với model: {model}")
+        return api_key, model
+    
+    def _lookup_cache(self, model: str, variations: Tuple[str, str, str],
+                      force_fresh: bool) -> Tuple[Optional[str], Optional[Dict[str, str]]]:
+        """
+        Check the local prompt cache.
         
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        Returns:
+            (cache_key, cached prompts); cache_key is None when the cache is off
+        """
+        if not self.config.get("prompt_cache_enabled", False):
+            return None, None
         
-        # Add randomization to break repetitive patterns
-        import random
-        from datetime import datetime
+        cache = get_prompt_cache()
+        cache_key = cache.make_key(model, *variations)
+        reuse_ratio = self.config.get("prompt_cache_reuse_ratio", 0.7)
+        if not force_fresh and self._rng.random() < reuse_ratio:
+            cached = cache.get(cache_key)
+            if cached:
+                self.logger.success("Đã dùng prompt từ cache")
+                return cache_key, cached
+        return cache_key, None
+    
+    def _build_payload(self, model: str, variations: Tuple[str, str, str]) -> dict:
+        """Build the chat completion payload for the chosen variations."""
+        chosen_style, chosen_location, chosen_ethnicity = variations
         
-        random_seed = random.randint(1000, 9999)
-        timestamp = datetime.now().strftime("%H%M%S")
+        # Add randomization to break repetitive patterns
+        user_message = _USER_MESSAGE_TEMPLATE.format(
+            seed=self._rng.randint(1000, 9999),
+            timestamp=time.strftime("%H%M%S"),
+            style=chosen_style,
+            location=chosen_location,
+            ethnicity=chosen_ethnicity
+        )
         
-        # Random style/theme variations to encourage diversity
-        styles = [
-            # Phong cách kinh điển & quyến rũ
-            "elegant and classy lingerie goddess",
-            "wild and untamed sex kitten",
-            "sweet and innocent but dangerously seductive",
-            "mysterious dark femme fatale",
-            "playful teasing little devil",
-            "confident dominant queen energy",
-            "shy but extremely horny",
-            "fierce and powerful dominatrix vibes",
-            "soft romantic bedroom eyes",
-            "naughty schoolgirl gone bad",
-            "mature experienced seductress",
-            "athletic toned gym bombshell",
-
-            # Phong cách nóng bỏng hơn, táo bạo
-            "slutty and proud of it",
-            "dripping wet and needy",
-            "cum-hungry bedroom stare",
-            "bound and begging",
-            "just-fucked messy hair glow",
-            "oiled up glistening skin",
-            "spread wide and shameless",
-            "choking hazard throat",
-            "dripping honey sweet & filthy",
-            "corrupted angel fallen from grace",
-            "high-class escort premium service",
-            "backseat car quickie energy",
-
-            # Roleplay & fantasy nặng đô
-            "bunny girl with very short tail",
-            "naughty nurse ready to examine",
-            "strict teacher punishment time",
-            "maid who doesn't clean at all",
-            "succubus ready to drain you",
-            "vampire queen blood & lust",
-            "catgirl in extreme heat",
-            "office slut after hours",
-            "cheerleader with no panties",
-            "bride on her last wild night",
-            "police officer frisking you hard",
-            "japanese gravure idol wet shirt",
-
-            # Aesthetic & mood đặc trưng
-            "neon cyberpunk strip club",
-            "gothic victorian dark erotica",
-            "vaporwave pastel lewd",
-            "luxury sugar baby aesthetic",
-            "y2k trashy hot mess",
-            "e-girl onlyfans teaser",
-            "softcore morning after glow",
-            "hardcore BDSM dungeon queen",
-            "glamour pornstar red carpet",
-            "tropical vacation sex on the beach",
-            "winter fireplace slow sensual",
-            "sweaty summer midnight hookup",
+        payload = dict(_BASE_PAYLOAD)
+        payload["model"] = model
+        payload["messages"] = [
+            self._build_system_message(model),
+            {"role": "user", "content": user_message}
         ]
+        return payload
+    
+    def _choose_variations(self) -> Tuple[str, str, str]:
+        """Pick random (style, location, ethnicity), avoiding recent styles."""
+        rng = self._rng
+        style = rng.choice(STYLES)
+        if style in self._recent_styles:
+            style = rng.choice(STYLES)
+        self._recent_styles.append(style)
+        return style, rng.choice(LOCATIONS), rng.choice(ETHNICITIES)
+    
+    def generate_prompts(self, force_fresh: bool = False) -> Optional[Dict[str, str]]:
+        """
+        Generate image and video prompts.
         
-        locations = [
-            "luxurious bedroom with silk sheets", "steamy bathroom with foggy mirror",
-            "beach cabana at sunset", "private pool with underwater lights",
-            "penthouse with city view at night", "studio with professional lighting",
-            "cozy living room by fireplace", "outdoor garden at golden hour",
-            "hotel room with mood lighting", "yacht deck under stars"
-        ]
+        When ``prompt_cache_enabled`` is set, a cached response for the same
+        (model, style, location, ethnicity) is reused with probability
+        ``prompt_cache_reuse_ratio`` instead of calling the API.
         
-        ethnicities = [
-            "Asian", "Caucasian", "Latina", "mixed-race", "Eastern European",
-            "Mediterranean", "Nordic", "Middle Eastern", "African", "South Asian"
-        ]
+        Args:
+            force_fresh: Always call the API, skipping the cache lookup
         
-        chosen_style = random.choice(styles)
-        chosen_location = random.choice(locations)
-        chosen_ethnicity = random.choice(ethnicities)
+        Returns:
+            Dict with keys: image_prompt, video1_prompt, video2_prompt
+            or None if failed
+        """
+        settings = self._check_settings()
+        if settings is None:
+            return None
+        api_key, model = settings
         
-        user_message = f"""Generate a completely NEW and UNIQUE set of prompts.
+        self.logger.info(f"Đang tạo prompt với model: {model}")
         
-Random seed: {random_seed}-{timestamp}
-Style direction: {chosen_style}
-Location: {chosen_location}
-Ethnicity: {chosen_ethnicity}
-
-Make this generation DIFFERENT from any previous ones. Be creative and surprising!"""
+        variations = self._choose_variations()
+        cache_key, cached = self._lookup_cache(model, variations, force_fresh)
+        if cached:
+            return cached
         
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 1.0,  # Increased for more randomness
-            "max_tokens": 1000
-        }
+        payload = self._build_payload(model, variations)
         
         try:
-            response = requests.post(
-                self.OPENROUTER_URL,
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
+            session = self._get_session()
+            with self._get_request_slots():
+                response = session.post(
+                    self.OPENROUTER_URL,
+                    headers=self._request_headers(api_key),
+                    json=payload,
+                    timeout=(5, 30)  # (connect, read)
+                )
             
             if response.status_code != 200:
-                self.logger.error(f"OpenRouter API lỗi: {response.status_code}")
-                self.logger.error(f"Phản hồi: {response.text}")
+                self._log_api_error(response)
                 return None
             
             data = response.json()
             content = data["choices"][0]["message"]["content"]
             
+            # Log prompt cache usage to verify cache hits
+            usage = data.get("usage") or {}
+            if usage:
+                cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+                self.logger.debug(f"Token prompt: {usage.get('prompt_tokens', 0)} (cache: {cached_tokens})")
+            
             # Parse JSON from response
             prompts = self._parse_json_response(content)
             
             if prompts:
+                if cache_key:
+                    get_prompt_cache().set(cache_key, prompts)
                 self.logger.success("Đã tạo prompt thành công")
                 self.logger.info(f"Image prompt: {prompts.get('image_prompt', '')[:100]}...")
             
@@ -235,25 +470,15 @@ Make this generation DIFFERENT from any previous ones. Be creative and surprisin
     
     def _parse_json_response(self, content: str) -> Optional[Dict[str, str]]:
         """Parse JSON from model response."""
-        # Try to find JSON in response
-        content = content.strip()
-        
-        # Remove markdown code blocks if present
-        if content.startswith("```json"):
-            content = content[7:]
-        if content.startswith("```"):
-            content = content[3:]
-        if content.endswith("```"):
-            content = content[:-3]
-        
-        content = content.strip()
+        # Extract the JSON object in one pass (fences/extra text are skipped)
+        match = _JSON_OBJECT_RE.search(content)
+        body = match.group(0) if match else content.strip()
         
         try:
-            prompts = json.loads(content)
+            prompts = orjson.loads(body) if orjson else json.loads(body)
             
             # Validate required keys
-            required_keys = ["image_prompt", "video1_prompt", "video2_prompt"]
-            if all(key in prompts for key in required_keys):
+            if isinstance(prompts, dict) and _REQUIRED_KEYS <= prompts.keys():
                 return prompts
             else:
                 self.logger.error("Thiếu key bắt buộc trong phản hồi")
@@ -261,11 +486,11 @@ Make this generation DIFFERENT from any previous ones. Be creative and surprisin
                 
         except json.JSONDecodeError as e:
             self.logger.error(f"JSON không hợp lệ: {e}")
-            self.logger.debug(f"Content: {content[:500]}")
+            self.logger.debug(f"Content: {body[:500]}")
             return None
 
 
-def generate_prompts() -> Optional[Dict[str, str]]:
+def generate_prompts(force_fresh: bool = False) -> Optional[Dict[str, str]]:
     """Convenience function to generate prompts."""
     generator = PromptGenerator()
-    return generator.generate_prompts()
+    return generator.generate_prompts(force_fresh=force_fresh)
@@ -1,54 +1,45 @@
 """
 Thread Manager - Multi-threading management for parallel processing
 """
+import os
 import threading
-import queue
-from typing import Callable, List, Optional, Any
-from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from typing import Callable, Deque, List, Optional, Any
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 from .config import get_config
 from .logger import get_logger
 
 
-class Task:
-    """Represents a task to be executed."""
-    
-    def __init__(self, func: Callable, args: tuple = (), kwargs: dict = None):
-        """
-        Create a task.
-        
-        Args:
-            func: Function to execute
-            args: Positional arguments
-            kwargs: Keyword arguments
-        """
-        self.func = func
-        self.args = args
-        self.kwargs = kwargs or {}
-        self.result = None
-        self.error = None
-        self.completed = False
-
-
 class ThreadManager:
     """Manage multiple worker threads."""
     
+    # Recent futures kept for wait_all()
+    MAX_TRACKED_FUTURES = 1000
+    
     def __init__(self, max_workers: int = None):
         """
         Initialize thread manager.
         
         Args:
-            max_workers: Maximum number of worker threads
+            max_workers: Maximum number of worker threads (defaults to
+                ``thread_count``, or an I/O-bound default if unset)
         """
         self.config = get_config()
         self.logger = get_logger()
         
         if max_workers is None:
-            max_workers = self.config.get("thread_count", 1)
+            # Workers mostly wait on network I/O, so allow many per core
+            max_workers = (self.config.get("thread_count")
+                           or min(64, (os.cpu_count() or 1) * 8))
         
-        self.max_workers = min(max_workers, 20)  # Cap at 20
+        self.max_workers = max(1, min(max_workers, self.config.get("thread_cap", 128)))
         self._executor: Optional[ThreadPoolExecutor] = None
-        self._futures: List[Future] = []
+        self._futures: Deque[Future] = deque(maxlen=self.MAX_TRACKED_FUTURES)
+        # Unfinished tasks, maintained by done callbacks
+        self._active = 0
+        self._active_lock = threading.Lock()
         self._running = False
         self._stop_event = threading.Event()
     
@@ -82,10 +73,26 @@ class ThreadManager:
             self.logger.error("Thread manager chưa chạy")
             return None
         
-        future = self._executor.submit(self._wrap_task, func, *args, **kwargs)
+        # Counted before submit so a fast task cannot decrement first
+        with self._active_lock:
+            self._active += 1
+        try:
+            future = self._executor.submit(self._wrap_task, func, *args, **kwargs)
+        except RuntimeError as e:
+            # Pool already shut down: undo the count so the cap is not lost
+            with self._active_lock:
+                self._active -= 1
+            self.logger.error(f"Không thể gửi task: {e}")
+            return None
+        future.add_done_callback(self._on_done)
         self._futures.append(future)
         return future
     
+    def _on_done(self, future: Future):
+        """Done callback: one fewer active task."""
+        with self._active_lock:
+            self._active -= 1
+    
     def _wrap_task(self, func: Callable, *args, **kwargs) -> Any:
         """Wrap task with error handling."""
         thread_name = threading.current_thread().name
@@ -131,23 +138,31 @@ class ThreadManager:
     
     def wait_all(self, timeout: float = None) -> List[Any]:
         """
-        Wait for all submitted tasks to complete.
+        Wait for submitted tasks to complete.
+        
+        Only the most recent ``MAX_TRACKED_FUTURES`` tasks are tracked;
+        callers that submit more should keep their own futures.
+        
+        Results are collected in completion order, so one slow task does
+        not hold up the ones that already finished.
         
         Args:
             timeout: Maximum time to wait
             
         Returns:
-            List of results
+            List of results (None for failed tasks)
         """
         results = []
         
-        for future in self._futures:
-            try:
-                result = future.result(timeout=timeout)
-                results.append(result)
-            except Exception as e:
-                results.append(None)
-                self.logger.error(f"Task lỗi: {e}")
+        try:
+            for future in as_completed(list(self._futures), timeout=timeout):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(None)
+                    self.logger.error(f"Task lỗi: {e}")
+        except FutureTimeoutError:
+            self.logger.warning("Hết thời gian chờ task")
         
         return results
     
@@ -156,60 +171,13 @@ class ThreadManager:
         if not self._running:
             return 0
         
-        active = sum(1 for f in self._futures if not f.done())
-        return active
+        return self._active
     
     def is_running(self) -> bool:
         """Check if thread manager is running."""
         return self._running
 
 
-class WorkerThread(threading.Thread):
-    """Individual worker thread for task execution."""
-    
-    def __init__(self, thread_id: int, task_queue: queue.Queue, 
-                 stop_event: threading.Event):
-        """
-        Create worker thread.
-        
-        Args:
-            thread_id: Thread identifier
-            task_queue: Queue to get tasks from
-            stop_event: Event to signal stop
-        """
-        super().__init__(name=f"Thread-{thread_id}")
-        self.thread_id = thread_id
-        self.task_queue = task_queue
-        self.stop_event = stop_event
-        self.logger = get_logger()
-        self.daemon = True
-    
-    def run(self):
-        """Run the worker thread."""
-        self.logger.info(f"Worker đã bắt đầu")
-        
-        while not self.stop_event.is_set():
-            try:
-                task = self.task_queue.get(timeout=1)
-                
-                if task is None:  # Poison pill
-                    break
-                
-                try:
-                    task.result = task.func(*task.args, **task.kwargs)
-                    task.completed = True
-                except Exception as e:
-                    task.error = e
-                    self.logger.error(f"Task thất bại: {e}")
-                finally:
-                    self.task_queue.task_done()
-                    
-            except queue.Empty:
-                continue
-        
-        self.logger.info(f"Worker đã dừng")
-
-
 # Global instance
 _manager_instance = None
 
@@ -2,8 +2,12 @@
 Video Generator - Orchestrates video generation workflow
 Creates 6s or 12s videos (12s by combining two 6s video clips)
 """
+import os
+import shutil
 import time
 import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Callable, Dict
@@ -21,6 +25,12 @@ class VideoGenerator:
     
     VIDEO2_PREFIX = "Continue the motion smoothly from this exact frame. Maintain the same style, lighting, and camera angle. "
     
+    # Source image extensions accepted in folder mode
+    IMAGE_SUFFIXES = frozenset({"jpg", "jpeg", "png"})
+    
+    # FFmpeg jobs (concat) run in the background while the browser moves on
+    FFMPEG_WORKERS = 2
+    
     def __init__(
         self,
         browser: BrowserManager,
@@ -45,6 +55,11 @@ class VideoGenerator:
         self._running = False
         self._stop_event = threading.Event()
         self._thread: Optional[threading.Thread] = None
+        self._ffmpeg_pool: Optional[ThreadPoolExecutor] = None
+        self._batch_ts = ""
+        # Waits for browser downloads to land while the browser keeps working
+        # (created per run, shut down when the run ends)
+        self._download_pool: Optional[ThreadPoolExecutor] = None
     
     def start(
         self,
@@ -71,6 +86,10 @@ class VideoGenerator:
         self._stop_event.clear()
         self._running = True
         
+        if auto_prompt:
+            # Mở sẵn kết nối tới OpenRouter trong lúc vòng lặp khởi động
+            threading.Thread(target=self.prompt_gen.warmup, daemon=True).start()
+        
         self._thread = threading.Thread(
             target=self._generation_loop,
             args=(mode, folder, batch_count, auto_prompt, duration),
@@ -89,11 +108,14 @@ class VideoGenerator:
     
     def _report_progress(self, current: int, total: int, status: str):
         """Report progress via callback."""
-        if self.on_progress:
+        # Callback lỗi sẽ được ghi log một lần rồi bị bỏ qua
+        on_progress = self.on_progress
+        if on_progress is not None:
             try:
-                self.on_progress(current, total, status)
-            except Exception as e:
-                self.logger.error(f"Lỗi callback progress: {e}")
+                on_progress(current, total, status)
+            except Exception:
+                self.logger.error(f"Lỗi callback progress:\n{traceback.format_exc()}")
+                self.on_progress = None
     
     def _generation_loop(
         self,
@@ -104,14 +126,18 @@ class VideoGenerator:
         duration: int = 6
     ):
         """Main generation loop."""
+        temp_dir = None
         try:
             duration_str = f"{duration}s"
             self.logger.info(f"Bắt đầu tạo {batch_count} video {duration_str} (mode: {mode})")
             self._report_progress(0, batch_count, "Đang khởi tạo...")
             
-            # Setup directories
+            # Tên file dùng thời điểm bắt đầu batch + số thứ tự video
+            self._batch_ts = datetime.now().strftime("%d-%m_%H-%M-%S")
+            
+            # Setup directories (mỗi batch một thư mục tạm, xoá một lần khi xong)
             videos_dir = Path(self.config.get("videos_dir", "./videos"))
-            temp_dir = videos_dir / "temp"
+            temp_dir = videos_dir / "temp" / self._batch_ts
             videos_dir.mkdir(parents=True, exist_ok=True)
             temp_dir.mkdir(parents=True, exist_ok=True)
             
@@ -120,7 +146,13 @@ class VideoGenerator:
             if mode == "folder" and folder:
                 folder_path = Path(folder)
                 if folder_path.exists():
-                    image_list = list(folder_path.glob("*.jpg")) + list(folder_path.glob("*.jpeg")) + list(folder_path.glob("*.png"))
+                    # Một lần đọc thư mục thay vì ba lần glob
+                    with os.scandir(folder_path) as entries:
+                        image_list = [
+                            Path(entry.path) for entry in entries
+                            if entry.name.rpartition(".")[2].lower() in self.IMAGE_SUFFIXES
+                            and entry.is_file()
+                        ]
                     self.logger.info(f"Tìm thấy {len(image_list)} ảnh trong thư mục")
             
             # Get manual prompts if not using auto-prompt
@@ -134,6 +166,18 @@ class VideoGenerator:
                 self.logger.info(f"Sử dụng {batch_count} prompt thủ công")
             
             completed = 0
+            delay = self.config.get("video_delay_ms", 2000) / 1000
+            self._download_pool = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="VideoDownload"
+            )
+            # Ghép video 12s chạy nền: Grok tạo video tiếp theo trong lúc FFmpeg ghép
+            concat_jobs = []
+            if duration != 6:
+                self._ffmpeg_pool = ThreadPoolExecutor(
+                    max_workers=self.FFMPEG_WORKERS,
+                    thread_name_prefix="FFmpeg"
+                )
             
             for i in range(batch_count):
                 if self._stop_event.is_set():
@@ -189,7 +233,7 @@ class VideoGenerator:
                             continue
                         
                         self._report_progress(i, batch_count, "Đang tạo ảnh nguồn...")
-                        source_image = self._generate_source_image(image_prompt, temp_dir)
+                        source_image = self._generate_source_image(image_prompt, temp_dir, i)
                         
                         if not source_image:
                             self.logger.error("Không thể tạo ảnh nguồn, bỏ qua video này")
@@ -208,8 +252,8 @@ class VideoGenerator:
                         if success:
                             completed += 1
                     else:
-                        # 12s mode: Create two videos and concatenate
-                        success = self._create_12s_video(
+                        # 12s mode: Create two videos, concatenate in background
+                        concat_job = self._create_12s_video(
                             source_image,
                             video1_prompt,
                             video2_prompt,
@@ -217,16 +261,23 @@ class VideoGenerator:
                             temp_dir,
                             i
                         )
-                        if success:
-                            completed += 1
+                        if concat_job:
+                            concat_jobs.append(concat_job)
                     
-                    # Small delay between videos
-                    time.sleep(2)
+                    # Delay between videos = video_delay_ms (trả về ngay khi có yêu cầu dừng)
+                    if self._stop_event.wait(delay):
+                        self.logger.info("Đã dừng theo yêu cầu")
+                        break
                     
                 except Exception as e:
                     self.logger.error(f"Lỗi tạo video {i + 1}: {e}")
                     continue
             
+            # Chờ các job ghép video còn lại
+            if concat_jobs:
+                self._report_progress(batch_count, batch_count, "Đang ghép video...")
+                completed += sum(1 for job in concat_jobs if job.result())
+            
             self.logger.success(f"Hoàn thành! Đã tạo {completed}/{batch_count} video")
             self._report_progress(batch_count, batch_count, f"Hoàn thành: {completed}/{batch_count} video")
             
@@ -234,6 +285,14 @@ class VideoGenerator:
             self.logger.error(f"Lỗi trong quá trình tạo video: {e}")
             self._report_progress(0, batch_count, f"Lỗi: {e}")
         finally:
+            if self._ffmpeg_pool:
+                self._ffmpeg_pool.shutdown(wait=True)
+                self._ffmpeg_pool = None
+            if self._download_pool:
+                self._download_pool.shutdown(wait=False)
+                self._download_pool = None
+            if temp_dir is not None:
+                self._remove_batch_temp_dir(temp_dir)
             self._running = False
     
     def _create_6s_video(
@@ -256,8 +315,7 @@ class VideoGenerator:
             True if successful
         """
         try:
-            timestamp = datetime.now().strftime("%d-%m_%H-%M-%S")
-            final_video = videos_dir / f"{timestamp}_{index + 1:03d}_6s.mp4"
+            final_video = videos_dir / f"{self._batch_ts}_{index + 1:03d}_6s.mp4"
             
             result = self._create_video(source_image, video_prompt, str(final_video))
             
@@ -286,10 +344,13 @@ class VideoGenerator:
         videos_dir: Path,
         temp_dir: Path,
         index: int
-    ) -> bool:
+    ) -> Optional[Future]:
         """
         Create a 12s video by concatenating two 6s videos.
         
+        Both clips are generated here; the concat is queued on the FFmpeg
+        pool so the browser can start on the next video meanwhile.
+        
         Args:
             source_image: Path to source image
             video1_prompt: Prompt for first video
@@ -299,7 +360,8 @@ class VideoGenerator:
             index: Video index
             
         Returns:
-            True if successful
+            Future resolving to True if the 12s video was written, or None
+            if a clip could not be created
         """
         try:
             # Create Video 1
@@ -310,14 +372,14 @@ class VideoGenerator:
             if result1 == "moderated":
                 self.logger.warning("Video 1 bị nhạy cảm (moderated), bỏ qua video này")
                 self.grok.go_back_to_imagine()
-                return False
+                return None
             if not result1:
                 self.logger.error("Không thể tạo video 1, bỏ qua")
                 self.grok.go_back_to_imagine()
-                return False
+                return None
             
             if self._stop_event.is_set():
-                return False
+                return None
             
             # Extract last frame from Video 1
             self._report_progress(index, -1, "Đang trích xuất frame cuối...")
@@ -326,7 +388,7 @@ class VideoGenerator:
             if not self.video_processor.extract_last_frame(str(video1_path), str(last_frame_path)):
                 self.logger.error("Không thể trích xuất frame cuối, bỏ qua")
                 self.grok.go_back_to_imagine()
-                return False
+                return None
             
             # Create Video 2 from last frame
             self._report_progress(index, -1, "Đang tạo video 2/2...")
@@ -337,38 +399,59 @@ class VideoGenerator:
             if result2 == "moderated":
                 self.logger.warning("Video 2 bị nhạy cảm (moderated), bỏ qua video này")
                 self.grok.go_back_to_imagine()
-                return False
+                return None
             if not result2:
                 self.logger.error("Không thể tạo video 2, bỏ qua")
                 self.grok.go_back_to_imagine()
-                return False
+                return None
             
             if self._stop_event.is_set():
-                return False
+                return None
             
-            # Concatenate videos
+            # Concatenate videos (background)
             self._report_progress(index, -1, "Đang ghép video...")
-            timestamp = datetime.now().strftime("%d-%m_%H-%M-%S")
-            final_video = videos_dir / f"{timestamp}_{index + 1:03d}_12s.mp4"
+            final_video = videos_dir / f"{self._batch_ts}_{index + 1:03d}_12s.mp4"
             
-            if self.video_processor.concat_videos(str(video1_path), str(video2_path), str(final_video)):
-                self.logger.success(f"Đã tạo video 12s: {final_video.name}")
+            return self._ffmpeg_pool.submit(
+                self._concat_12s_video,
+                video1_path, video2_path, final_video
+            )
                 
-                # Cleanup temp files for this iteration
-                self._cleanup_temp_files([video1_path, video2_path, last_frame_path])
+        except Exception as e:
+            self.logger.error(f"Lỗi tạo video 12s: {e}")
+            return None
+    
+    def _concat_12s_video(
+        self,
+        video1_path: Path,
+        video2_path: Path,
+        final_video: Path
+    ) -> bool:
+        """Concatenate the two clips (runs on the FFmpeg pool)."""
+        try:
+            # Encode lại bị huỷ ngay khi người dùng bấm dừng
+            if self.video_processor.concat_videos(
+                str(video1_path), str(video2_path), str(final_video),
+                on_progress=lambda progress: not self._stop_event.is_set()
+            ):
+                self.logger.success(f"Đã tạo video 12s: {final_video.name}")
                 return True
             else:
                 self.logger.error("Không thể ghép video")
                 return False
-                
         except Exception as e:
-            self.logger.error(f"Lỗi tạo video 12s: {e}")
+            self.logger.error(f"Lỗi ghép video 12s: {e}")
             return False
     
-    def _generate_source_image(self, image_prompt: str, temp_dir: Path) -> Optional[str]:
+    def _generate_source_image(self, image_prompt: str, temp_dir: Path, index: int) -> Optional[str]:
         """
         Generate source image using Grok Imagine.
         
+        Args:
+            image_prompt: Prompt for the image
+            temp_dir: Directory for temporary files
+            index: Video index (used in the file name)
+        
         Returns:
             Path to downloaded image or None
         """
@@ -391,17 +474,16 @@ class VideoGenerator:
             # Wait for generation
             result = self.grok.wait_for_generation_complete(initial_count)
             
-            if not result:
-                return None
-            
             # Check for rate limit
-            if isinstance(result, tuple) and result[1] == "rate_limit":
+            if result.rate_limited:
                 self.logger.warning("Rate limit đạt khi tạo ảnh")
                 return None
             
+            if not result.downloaded:
+                return None
+            
             # Download first image
-            timestamp = datetime.now().strftime("%d-%m_%H-%M-%S")
-            image_path = temp_dir / f"source_{timestamp}.jpg"
+            image_path = temp_dir / f"source_{self._batch_ts}_{index + 1:03d}.jpg"
             
             if self.grok.get_first_image_from_batch(str(image_path)):
                 self.logger.success(f"Đã tạo ảnh nguồn: {image_path.name}")
@@ -440,9 +522,9 @@ class VideoGenerator:
             downloaded_any = False
             output_path_obj = Path(output_path)
             
-            # Navigate to Imagine page first
+            # Navigate to Imagine page first (driver.get chờ trang tải xong,
+            # upload_image tự chờ input file xuất hiện)
             self.grok.navigate_to_imagine()
-            time.sleep(2)
             
             # Upload image with retry (moderation service can fail temporarily)
             max_retries = 3
@@ -457,7 +539,6 @@ class VideoGenerator:
                         self.logger.warning(f"Upload thất bại, thử lại ({attempt + 2}/{max_retries})...")
                         # Go back and try again
                         self.grok.navigate_to_imagine()
-                        time.sleep(2)
             
             if not upload_success:
                 self.logger.error("Không thể upload ảnh sau nhiều lần thử")
@@ -470,7 +551,6 @@ class VideoGenerator:
             
             # Make sure Video mode is selected (click film icon)
             self.grok.click_video_mode()
-            time.sleep(1)
             
             # Wait for Grok's automatic first video generation to complete
             self.logger.info("Đang chờ video tự động tạo...")
@@ -485,51 +565,44 @@ class VideoGenerator:
                 return "moderated"
             
             # === STEP 1: Download auto-generated video via Download button ===
-            time.sleep(1)
+            # (click_download_button tự chờ nút có thể click)
             
             # Create path for auto video with _auto suffix
             auto_output_path = output_path_obj.parent / f"{output_path_obj.stem}_auto{output_path_obj.suffix}"
             
             # Use download button to avoid 403 errors
-            if self.grok.download_video_via_button(str(auto_output_path)):
-                self.logger.success(f"Đã tải video tự động: {auto_output_path.name}")
-                downloaded_any = True
+            # Chỉ click trên luồng trình duyệt; chờ file tải xong chạy nền
+            # trong lúc Grok tạo video từ prompt
+            auto_download = None
+            if self.grok.click_download_button():
+                auto_download = self._download_pool.submit(
+                    self.grok.wait_for_download, str(auto_output_path)
+                )
             else:
                 self.logger.warning("Không thể tải video tự động qua nút Download")
             
             # === STEP 2: Generate video from prompt ===
-            time.sleep(1)
+            # (enter_video_prompt tự chờ textarea)
             
+            video_url = None
+            prompt_submitted = False
             # Enter video prompt into textarea
             if not self.grok.enter_video_prompt(prompt):
                 self.logger.error("Không thể nhập prompt video")
-                # Still return success if we downloaded auto video
-                if downloaded_any:
-                    self.grok.go_back_to_imagine()
-                    time.sleep(1)
-                    return "success"
-                return None
-            
             # Submit prompt to generate new video with our prompt
-            if not self.grok.submit_video_prompt():
+            elif not self.grok.submit_video_prompt():
                 self.logger.error("Không thể gửi prompt")
-                if downloaded_any:
-                    self.grok.go_back_to_imagine()
-                    time.sleep(1)
-                    return "success"
-                return None
+            else:
+                prompt_submitted = True
+                # Wait for our custom video to be generated
+                video_url = self.grok.wait_for_video_generation()
             
-            # Wait for our custom video to be generated
-            video_url = self.grok.wait_for_video_generation()
+            # Video tự động phải tải xong trước khi bắt đầu tải video tiếp theo
+            downloaded_any = self._finish_download(auto_download, auto_output_path)
             
             # Check if video from prompt is moderated
             if video_url == "moderated":
                 self.logger.warning("Video từ prompt bị nhạy cảm, bỏ qua")
-                # Still success if we got auto video
-                if downloaded_any:
-                    self.grok.go_back_to_imagine()
-                    time.sleep(1)
-                    return "success"
             elif video_url:
                 # Download video from prompt via Download button
                 if self.grok.download_video_via_button(output_path):
@@ -537,12 +610,11 @@ class VideoGenerator:
                     downloaded_any = True
                 else:
                     self.logger.warning("Không thể tải video từ prompt")
-            else:
+            elif prompt_submitted:
                 self.logger.warning("Video từ prompt không được tạo")
             
             # Go back to Imagine page for next operation
             self.grok.go_back_to_imagine()
-            time.sleep(1)
             
             return "success" if downloaded_any else None
             
@@ -555,12 +627,32 @@ class VideoGenerator:
                 pass
             return None
     
-    def _cleanup_temp_files(self, files: list):
-        """Clean up temporary files."""
-        for file_path in files:
-            try:
-                path = Path(file_path)
-                if path.exists():
-                    path.unlink()
-            except Exception:
-                pass
+    def _finish_download(self, download: Optional[Future], output_path: Path) -> bool:
+        """Wait for a background auto-video download; True if it was saved."""
+        if download is None:
+            return False
+        if download.result():
+            self.logger.success(f"Đã tải video tự động: {output_path.name}")
+            return True
+        self.logger.warning("Không thể tải video tự động qua nút Download")
+        return False
+    
+    def _remove_batch_temp_dir(self, temp_dir: Path):
+        """
+        Delete a batch's temp folder in one go.
+        
+        Auto-generated clips are moved up to temp/ first, where they were
+        kept before per-batch folders.
+        """
+        # Một lần quét thư mục, không tạo Path cho từng file
+        try:
+            with os.scandir(temp_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith("_auto.mp4") and entry.is_file():
+                        try:
+                            os.replace(entry.path, os.path.join(temp_dir.parent, entry.name))
+                        except OSError:
+                            pass
+        except OSError:
+            pass
+        shutil.rmtree(temp_dir, ignore_errors=True)
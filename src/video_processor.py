@@ -1,14 +1,103 @@
 """
 Video Processor - FFmpeg operations for video processing
 """
+import json
 import os
+import shutil
+import stat
+import struct
 import subprocess
+import sys
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Optional, Tuple
 
+from .config import get_config
 from .logger import get_logger
 
 
+def _mp4_duration(path: str) -> Optional[float]:
+    """
+    Read duration from an MP4/MOV 'moov/mvhd' box without running ffprobe.
+    
+    Only box headers are read (mdat is skipped with seek), so this costs a
+    few small reads wherever moov sits in the file.
+    
+    Returns:
+        Duration in seconds, or None if the file is not a readable MP4
+    """
+    try:
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            end = file_size
+            pos = 0
+            while pos + 8 <= end:
+                f.seek(pos)
+                size, box_type = struct.unpack('>I4s', f.read(8))
+                header = 8
+                if size == 1:
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    header = 16
+                elif size == 0:
+                    size = end - pos
+                if size < header:
+                    return None
+                
+                if box_type == b'moov':
+                    # Descend: scan moov's children for mvhd
+                    end = pos + size
+                    pos += header
+                    continue
+                if box_type == b'mvhd':
+                    version = f.read(1)[0]
+                    f.read(3)  # flags
+                    if version == 1:
+                        _, _, timescale, duration = struct.unpack('>QQIQ', f.read(28))
+                    else:
+                        _, _, timescale, duration = struct.unpack('>IIII', f.read(16))
+                    # Fragmented MP4 leaves duration 0 here: let ffprobe answer
+                    if timescale == 0 or duration == 0:
+                        return None
+                    return duration / timescale
+                pos += size
+    except (OSError, struct.error, IndexError):
+        pass
+    return None
+
+
+# Stream fields that must match for a stream-copy concat (codec_type first)
+_STREAM_SIGNATURE_FIELDS = (
+    "codec_type", "codec_name", "profile", "width", "height", "pix_fmt",
+    "time_base", "sample_rate", "channels",
+)
+
+
+def _parse_stream_signature(output: bytes) -> Optional[tuple]:
+    """
+    Build a stream signature from ffprobe '-of json' output.
+    
+    JSON is used because ffprobe's csv writer prints fields in its own
+    order, not the -show_entries order.
+    
+    Returns:
+        One tuple of _STREAM_SIGNATURE_FIELDS values per stream, or None if
+        the output cannot be parsed
+    """
+    try:
+        streams = json.loads(output).get("streams", [])
+    except (ValueError, AttributeError):
+        return None
+    return tuple(
+        tuple(str(stream.get(field, "")) for field in _STREAM_SIGNATURE_FIELDS)
+        for stream in streams
+    )
+
+
+def _has_audio(signature: Optional[tuple]) -> bool:
+    """Check whether a stream signature contains an audio stream."""
+    return bool(signature) and any(stream[0] == "audio" for stream in signature)
+
+
 class VideoProcessor:
     """Process videos using FFmpeg."""
     
@@ -19,16 +108,53 @@ class VideoProcessor:
     }
     FFPROBE_MAC_URL = "https://evermeet.cx/ffmpeg/getrelease/ffprobe/zip"
     
+    # Attempts per download; each retry resumes from the partial file
+    DOWNLOAD_ATTEMPTS = 3
+    
+    # (ffmpeg, ffprobe) once found, shared by all instances in the process
+    _resolved_paths: Optional[Tuple[Path, Path]] = None
+    
     def __init__(self):
         """Initialize video processor."""
         self.logger = get_logger()
         self.ffmpeg_dir = Path(__file__).parent.parent / "ffmpeg" / "bin"
         self._setup_ffmpeg()
+        
+        # Command strings/prefix built once, not per ffmpeg call
+        self._ffmpeg_str = str(self.ffmpeg_path)
+        self._ffprobe_str = str(self.ffprobe_path)
+        self._ffmpeg_base = (self._ffmpeg_str, '-y', '-hide_banner', '-loglevel', 'error')
+        
+        # Probed durations by (path, mtime_ns, size)
+        self._duration_cache: Dict[Tuple[str, int, int], float] = {}
+        
+        # '-hwaccel' arguments for frame extraction (resolved on first use)
+        self._hwaccel_args: Optional[Tuple[str, ...]] = None
+        
+        # Windows: no console window per ffmpeg/ffprobe spawn
+        self._popen_kwargs = {}
+        if os.name == 'nt':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            self._popen_kwargs = {
+                'creationflags': subprocess.CREATE_NO_WINDOW,
+                'startupinfo': startupinfo,
+            }
     
     def _setup_ffmpeg(self):
-        """Setup FFmpeg - check local or download."""
-        import platform
-        system = platform.system()
+        """Setup FFmpeg - check local or download (result cached per process)."""
+        cached = VideoProcessor._resolved_paths
+        if cached is not None:
+            self.ffmpeg_path, self.ffprobe_path = cached
+            return
+        
+        # sys.platform is a constant; platform.system() may query the OS
+        if sys.platform.startswith("win"):
+            system = "Windows"
+        elif sys.platform == "darwin":
+            system = "Darwin"
+        else:
+            system = sys.platform
         
         ext = ".exe" if system == "Windows" else ""
         self.ffmpeg_path = self.ffmpeg_dir / f"ffmpeg{ext}"
@@ -36,6 +162,7 @@ class VideoProcessor:
         
         if self.ffmpeg_path.exists():
             self.logger.info(f"Đã tìm thấy FFmpeg: {self.ffmpeg_path}")
+            VideoProcessor._resolved_paths = (self.ffmpeg_path, self.ffprobe_path)
             return
         
         # Download FFmpeg
@@ -48,24 +175,84 @@ class VideoProcessor:
             self._download_mac()
         else:
             self.logger.error(f"Không hỗ trợ tự động tải cho {system}")
+        
+        if self.ffmpeg_path.exists():
+            VideoProcessor._resolved_paths = (self.ffmpeg_path, self.ffprobe_path)
+    
+    def _download_zip(self, url: str, part_name: str, timeout: int) -> Path:
+        """
+        Download a zip into ffmpeg_dir, resuming a previous partial download.
+        
+        Data is streamed in 1 MB chunks to ``<part_name>``; an interrupted
+        download continues with an HTTP Range request instead of starting
+        over. The archive is CRC-checked before it is returned.
+        
+        Returns:
+            Path to the verified zip; the caller deletes it after extracting
+        """
+        import requests, zipfile
+        
+        part_path = self.ffmpeg_dir / part_name
+        
+        for attempt in range(self.DOWNLOAD_ATTEMPTS):
+            existing = part_path.stat().st_size if part_path.exists() else 0
+            headers = {"Range": f"bytes={existing}-"} if existing else {}
+            try:
+                with requests.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                    if response.status_code == 416:
+                        # Range starts at end of file: already complete
+                        pass
+                    else:
+                        response.raise_for_status()
+                        # 206 = server resumed; 200 = full body, start over
+                        mode = 'ab' if response.status_code == 206 else 'wb'
+                        if existing and mode == 'ab':
+                            self.logger.info(f"Tiếp tục tải từ {existing // (1 << 20)} MB")
+                        with open(part_path, mode) as f:
+                            for chunk in response.iter_content(chunk_size=1 << 20):
+                                f.write(chunk)
+            except requests.RequestException as e:
+                if attempt == self.DOWNLOAD_ATTEMPTS - 1:
+                    raise
+                self.logger.warning(f"Tải bị gián đoạn ({e}), thử lại...")
+                continue
+            
+            # Corrupt/truncated archive: drop it and download again
+            try:
+                with zipfile.ZipFile(part_path) as zf:
+                    if zf.testzip() is None:
+                        return part_path
+            except zipfile.BadZipFile:
+                pass
+            self.logger.warning("File tải về bị lỗi, tải lại từ đầu...")
+            part_path.unlink(missing_ok=True)
+        
+        raise IOError(f"Không thể tải {url}")
+    
+    def _extract_member(self, zf, name: str, dest: Path, executable: bool = False):
+        """Extract one archive member to dest atomically (no half-written binaries)."""
+        tmp_path = dest.with_name(dest.name + ".tmp")
+        with zf.open(name) as src, open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        if executable:
+            tmp_path.chmod(tmp_path.stat().st_mode | stat.S_IEXEC)
+        os.replace(tmp_path, dest)
     
     def _download_windows(self):
         """Download FFmpeg for Windows."""
-        import requests, zipfile, io, shutil
+        import zipfile
         
         try:
             self.logger.info("Đang tải FFmpeg cho Windows (~100MB)...")
-            response = requests.get(self.FFMPEG_URLS["Windows"], stream=True, timeout=300)
-            response.raise_for_status()
+            zip_path = self._download_zip(self.FFMPEG_URLS["Windows"], "ffmpeg.zip.part", timeout=300)
             
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            with zipfile.ZipFile(zip_path) as zf:
                 for name in zf.namelist():
                     if name.endswith("ffmpeg.exe"):
-                        with zf.open(name) as src, open(self.ffmpeg_path, 'wb') as dst:
-                            shutil.copyfileobj(src, dst)
+                        self._extract_member(zf, name, self.ffmpeg_path)
                     elif name.endswith("ffprobe.exe"):
-                        with zf.open(name) as src, open(self.ffprobe_path, 'wb') as dst:
-                            shutil.copyfileobj(src, dst)
+                        self._extract_member(zf, name, self.ffprobe_path)
+            zip_path.unlink(missing_ok=True)
             
             self.logger.success(f"Đã cài FFmpeg: {self.ffmpeg_path}")
         except Exception as e:
@@ -73,46 +260,141 @@ class VideoProcessor:
     
     def _download_mac(self):
         """Download FFmpeg for Mac."""
-        import requests, zipfile, io, stat
+        import zipfile
         
         try:
             # Download ffmpeg
             self.logger.info("Đang tải FFmpeg cho Mac...")
-            response = requests.get(self.FFMPEG_URLS["Darwin"], timeout=120)
-            response.raise_for_status()
+            zip_path = self._download_zip(self.FFMPEG_URLS["Darwin"], "ffmpeg.zip.part", timeout=120)
             
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            with zipfile.ZipFile(zip_path) as zf:
                 for name in zf.namelist():
                     if "ffmpeg" in name.lower() and not name.endswith('/'):
-                        with zf.open(name) as src, open(self.ffmpeg_path, 'wb') as dst:
-                            dst.write(src.read())
-                        self.ffmpeg_path.chmod(self.ffmpeg_path.stat().st_mode | stat.S_IEXEC)
+                        self._extract_member(zf, name, self.ffmpeg_path, executable=True)
+            zip_path.unlink(missing_ok=True)
             
             # Download ffprobe
             self.logger.info("Đang tải FFprobe cho Mac...")
-            response = requests.get(self.FFPROBE_MAC_URL, timeout=120)
-            response.raise_for_status()
+            zip_path = self._download_zip(self.FFPROBE_MAC_URL, "ffprobe.zip.part", timeout=120)
             
-            with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            with zipfile.ZipFile(zip_path) as zf:
                 for name in zf.namelist():
                     if "ffprobe" in name.lower() and not name.endswith('/'):
-                        with zf.open(name) as src, open(self.ffprobe_path, 'wb') as dst:
-                            dst.write(src.read())
-                        self.ffprobe_path.chmod(self.ffprobe_path.stat().st_mode | stat.S_IEXEC)
+                        self._extract_member(zf, name, self.ffprobe_path, executable=True)
+            zip_path.unlink(missing_ok=True)
             
             self.logger.success(f"Đã cài FFmpeg: {self.ffmpeg_path}")
         except Exception as e:
             self.logger.error(f"Lỗi tải FFmpeg: {e}")
     
     def _get_ffmpeg_cmd(self) -> str:
-        return str(self.ffmpeg_path)
+        return self._ffmpeg_str
     
     def _get_ffprobe_cmd(self) -> str:
-        return str(self.ffprobe_path)
+        return self._ffprobe_str
+    
+    def _run(self, cmd: list, input: bytes = None,
+             capture_stdout: bool = False) -> subprocess.CompletedProcess:
+        """
+        Run an ffmpeg/ffprobe command.
+        
+        Output stays as bytes: stderr is only decoded (via _stderr_text) on
+        the error path, and stdout is discarded unless capture_stdout is set.
+        stdin is closed unless input is given, so ffmpeg never waits on it.
+        """
+        if input is None:
+            stdin_kwargs = {'stdin': subprocess.DEVNULL}
+        else:
+            stdin_kwargs = {'input': input}
+        return subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE if capture_stdout else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            **stdin_kwargs, **self._popen_kwargs
+        )
+    
+    def _run_with_progress(self, cmd: list,
+                           on_progress: Callable[[Dict[str, str]], bool]) -> subprocess.CompletedProcess:
+        """
+        Run an ffmpeg command, reporting its -progress blocks.
+        
+        ffmpeg writes key=value lines (frame, out_time_ms, speed, ...) to
+        stdout, one block per update ending with a 'progress' line. Each block
+        is passed to on_progress; returning False terminates ffmpeg.
+        """
+        cmd = [*cmd[:-1], '-progress', 'pipe:1', '-nostats', cmd[-1]]
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **self._popen_kwargs
+        )
+        
+        # stderr is drained on a side thread so a full pipe never blocks ffmpeg
+        stderr_chunks = []
+        stderr_thread = threading.Thread(
+            target=lambda: stderr_chunks.append(proc.stderr.read()),
+            daemon=True
+        )
+        stderr_thread.start()
+        
+        block: Dict[str, str] = {}
+        with proc.stdout:
+            for raw_line in proc.stdout:
+                key, sep, value = raw_line.decode('utf-8', errors='replace').strip().partition('=')
+                if not sep:
+                    continue
+                block[key] = value
+                if key == 'progress':
+                    if not on_progress(block):
+                        proc.terminate()
+                        break
+                    block = {}
+        
+        returncode = proc.wait()
+        stderr_thread.join()
+        return subprocess.CompletedProcess(cmd, returncode, None, b"".join(stderr_chunks))
+    
+    @staticmethod
+    def _stderr_text(result: subprocess.CompletedProcess) -> str:
+        """Decode a command's stderr for logging."""
+        return result.stderr.decode('utf-8', errors='replace').strip()
     
     def is_available(self) -> bool:
         return self.ffmpeg_path.exists()
     
+    def _get_hwaccel_args(self) -> Tuple[str, ...]:
+        """
+        Get '-hwaccel' arguments from the ffmpeg_hwaccel setting.
+        
+        Off by default: for the short window decoded by extract_last_frame,
+        GPU decoder setup often costs more than it saves. A named accelerator
+        is checked once against 'ffmpeg -hwaccels'; "auto" lets ffmpeg pick.
+        """
+        if self._hwaccel_args is not None:
+            return self._hwaccel_args
+        
+        name = str(get_config().get("ffmpeg_hwaccel", "") or "").strip().lower()
+        args: Tuple[str, ...] = ()
+        if name == "auto":
+            args = ('-hwaccel', 'auto')
+        elif name:
+            try:
+                result = self._run([self._ffmpeg_str, '-hide_banner', '-hwaccels'],
+                                   capture_stdout=True)
+                # First line is the "Hardware acceleration methods:" header
+                available = result.stdout.decode('utf-8', errors='replace').split()[3:]
+            except OSError:
+                available = []
+            if name in available:
+                args = ('-hwaccel', name)
+            else:
+                self.logger.warning(f"FFmpeg không hỗ trợ hwaccel '{name}', dùng CPU")
+        
+        self._hwaccel_args = args
+        return args
+    
     def extract_last_frame(self, video_path: str, output_path: str) -> bool:
         """
         Extract the last frame from a video.
@@ -134,63 +416,147 @@ class VideoProcessor:
         # Ensure output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # ffmpeg writes to a temp name that is renamed into place on success,
+        # so a crash never leaves a half-written file at output_path
+        tmp_path = self._temp_output_path(output_path)
+        
         try:
-            # Get video duration first
-            duration = self._get_video_duration(str(video_path))
-            
-            if duration is None or duration <= 0:
-                self.logger.error("Không lấy được thời lượng video")
-                return False
-            
-            # Extract frame at the last second
-            last_second = max(0, duration - 0.1)
-            
+            # Seek relative to end of file: no ffprobe call or full demux needed.
+            # The output-side -ss drops the first 0.4s of that window after
+            # decoding, so only the last few frames are JPEG-encoded; -update 1
+            # keeps overwriting the image, so the true last frame wins
             cmd = [
-                self._get_ffmpeg_cmd(), '-y',
-                '-ss', str(last_second),
+                *self._ffmpeg_base,
+                *self._get_hwaccel_args(),
+                '-sseof', '-0.5',
+                # Input option (before -i): single-threaded decoder. Only a
+                # handful of frames are decoded, so thread startup and
+                # frame-threading delay cost more than they save
+                '-threads', '1',
                 '-i', str(video_path),
-                '-frames:v', '1',
+                '-ss', '0.4',
+                '-update', '1',
                 '-q:v', '2',
-                str(output_path)
+                str(tmp_path)
             ]
             
             self.logger.debug(f"Running: {' '.join(cmd)}")
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run(cmd)
+            
+            if result.returncode == 0 and self._finalize_output(tmp_path, output_path):
+                self.logger.success(f"Đã trích xuất frame cuối: {output_path}")
+                return True
+            
+            # Older ffmpeg without -sseof (or a failing hwaccel): seek using
+            # the probed duration, decoded on the CPU
+            self.logger.debug("Trích frame bằng -sseof thất bại, dùng thời lượng video")
+            result = self._extract_frame_at_duration(video_path, tmp_path)
+            if result is None:
+                return False
             
-            if result.returncode == 0 and output_path.exists():
+            if result.returncode == 0 and self._finalize_output(tmp_path, output_path):
                 self.logger.success(f"Đã trích xuất frame cuối: {output_path}")
                 return True
             else:
-                self.logger.error(f"FFmpeg lỗi: {result.stderr}")
+                self.logger.error(f"FFmpeg lỗi: {self._stderr_text(result)}")
                 return False
                 
         except Exception as e:
             self.logger.error(f"Không thể trích xuất frame: {e}")
             return False
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    
+    @staticmethod
+    def _temp_output_path(output_path: Path) -> Path:
+        """Temp sibling for ffmpeg output (keeps the extension so the muxer is detected)."""
+        return output_path.with_name(f"{output_path.stem}.tmp{output_path.suffix}")
+    
+    @staticmethod
+    def _finalize_output(tmp_path: Path, output_path: Path) -> bool:
+        """Atomically move finished output into place; False if ffmpeg wrote nothing."""
+        try:
+            os.replace(tmp_path, output_path)
+            return True
+        except OSError:
+            return False
+    
+    def _extract_frame_at_duration(self, video_path: Path,
+                                   output_path: Path) -> Optional[subprocess.CompletedProcess]:
+        """Extract the last frame by seeking to (duration - 0.1s); None if no duration."""
+        duration = self._get_video_duration(str(video_path))
+        
+        if duration is None or duration <= 0:
+            self.logger.error("Không lấy được thời lượng video")
+            return None
+        
+        # Extract frame at the last second
+        last_second = max(0, duration - 0.1)
+        
+        cmd = [
+            *self._ffmpeg_base,
+            '-ss', str(last_second),
+            '-i', str(video_path),
+            '-frames:v', '1',
+            '-q:v', '2',
+            str(output_path)
+        ]
+        
+        self.logger.debug(f"Running: {' '.join(cmd)}")
+        
+        return self._run(cmd)
     
     def _get_video_duration(self, video_path: str) -> Optional[float]:
-        """Get video duration in seconds using ffprobe."""
+        """
+        Get video duration in seconds (MP4 header, else ffprobe).
+        
+        Results are cached per (path, mtime, size), so an unchanged file is
+        probed only once.
+        """
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return None
+        cache_key = (video_path, stat.st_mtime_ns, stat.st_size)
+        duration = self._duration_cache.get(cache_key)
+        if duration is not None:
+            return duration
+        
+        # MP4/MOV: read the header box directly, ffprobe only as fallback
+        duration = _mp4_duration(video_path)
+        if duration is not None and duration > 0:
+            self._duration_cache[cache_key] = duration
+            return duration
+        
         try:
             cmd = [
                 self._get_ffprobe_cmd(),
                 '-v', 'error',
+                # Duration comes from the container header: probe little data
+                '-probesize', '1048576',
+                '-analyzeduration', '1000000',
                 '-show_entries', 'format=duration',
                 '-of', 'default=noprint_wrappers=1:nokey=1',
                 video_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run(cmd, capture_stdout=True)
             
             if result.returncode == 0:
-                return float(result.stdout.strip())
+                duration = float(result.stdout.strip())
+                # Only usable durations are cached
+                if duration > 0:
+                    self._duration_cache[cache_key] = duration
+                return duration
             else:
                 return None
                 
         except (ValueError, subprocess.SubprocessError):
             return None
     
-    def concat_videos(self, video1_path: str, video2_path: str, output_path: str) -> bool:
+    def concat_videos(self, video1_path: str, video2_path: str, output_path: str,
+                      on_progress: Optional[Callable[[Dict[str, str]], bool]] = None) -> bool:
         """
         Concatenate two videos into one.
         
@@ -198,6 +564,8 @@ class VideoProcessor:
             video1_path: Path to first video
             video2_path: Path to second video
             output_path: Path to output video
+            on_progress: Called with each ffmpeg progress block while
+                re-encoding; return False to cancel
             
         Returns:
             True if successful
@@ -217,60 +585,129 @@ class VideoProcessor:
         # Ensure output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Written under a temp name and renamed into place on success
+        tmp_path = self._temp_output_path(output_path)
+        
         try:
-            # Create concat file
-            concat_file = output_path.parent / "concat_list.txt"
-            
-            with open(concat_file, 'w') as f:
-                f.write(f"file '{video1_path.absolute()}'\n")
-                f.write(f"file '{video2_path.absolute()}'\n")
-            
-            cmd = [
-                self._get_ffmpeg_cmd(), '-y',
-                '-f', 'concat',
-                '-safe', '0',
-                '-i', str(concat_file),
-                '-c', 'copy',
-                str(output_path)
-            ]
+            # Stream copy only works when both clips have the same parameters:
+            # the concat demuxer can exit 0 on mismatched clips and still
+            # write corrupt/desynced output, so every pair is probed
+            signature1 = self._get_stream_signature(str(video1_path))
+            signature2 = self._get_stream_signature(str(video2_path))
             
-            self.logger.debug(f"Running: {' '.join(cmd)}")
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            if signature1 and signature1 == signature2:
+                result = self._concat_copy(video1_path, video2_path, tmp_path)
+                if result.returncode == 0 and self._finalize_output(tmp_path, output_path):
+                    self.logger.success(f"Đã ghép video: {output_path}")
+                    return True
+                self.logger.warning(f"Ghép copy thất bại, encode lại: {self._stderr_text(result)}")
+            else:
+                self.logger.info("Hai video khác thông số, ghép bằng encode lại")
             
-            # Cleanup concat file
-            if concat_file.exists():
-                concat_file.unlink()
+            # Keep audio only if both clips have it (concat filter needs a pair)
+            has_audio = _has_audio(signature1) and _has_audio(signature2)
+            result = self._concat_reencode(video1_path, video2_path, tmp_path,
+                                           has_audio, on_progress)
             
-            if result.returncode == 0 and output_path.exists():
+            if result.returncode == 0 and self._finalize_output(tmp_path, output_path):
                 self.logger.success(f"Đã ghép video: {output_path}")
                 return True
             else:
-                self.logger.error(f"FFmpeg lỗi: {result.stderr}")
+                self.logger.error(f"FFmpeg lỗi: {self._stderr_text(result)}")
                 return False
                 
         except Exception as e:
             self.logger.error(f"Không thể ghép video: {e}")
             return False
+        finally:
+            tmp_path.unlink(missing_ok=True)
     
-    def cleanup_temp_videos(self, temp_dir: str):
-        """Clean up temporary video files."""
-        temp_path = Path(temp_dir)
-        
-        if not temp_path.exists():
-            return
+    def _get_stream_signature(self, video_path: str) -> Optional[tuple]:
+        """
+        Get stream parameters that must match for a stream-copy concat.
         
+        Returns:
+            One tuple of _STREAM_SIGNATURE_FIELDS values per stream, or None
+            on error
+        """
         try:
-            for file in temp_path.glob("*.mp4"):
-                file.unlink()
-            
-            for file in temp_path.glob("*.jpg"):
-                file.unlink()
+            cmd = [
+                self._get_ffprobe_cmd(),
+                '-v', 'error',
+                '-show_entries', 'stream=' + ','.join(_STREAM_SIGNATURE_FIELDS),
+                '-of', 'json',
+                video_path
+            ]
             
-            self.logger.info(f"Đã dọn file tạm trong: {temp_dir}")
+            result = self._run(cmd, capture_stdout=True)
             
-        except Exception as e:
-            self.logger.warning(f"Không thể dọn file tạm: {e}")
+            if result.returncode == 0:
+                return _parse_stream_signature(result.stdout)
+            else:
+                return None
+                
+        except subprocess.SubprocessError:
+            return None
+    
+    def _concat_copy(self, video1_path: Path, video2_path: Path,
+                     output_path: Path) -> subprocess.CompletedProcess:
+        """Concatenate with the concat demuxer and stream copy (no re-encode)."""
+        # The file list is fed on stdin: no concat_list.txt to write and delete.
+        # cwd is read once for all entries (join keeps absolute paths as is)
+        cwd = os.getcwd()
+        concat_list = "".join(
+            "file '{}'\n".format(os.path.join(cwd, path).replace("'", "'\\''"))
+            for path in (video1_path, video2_path)
+        )
+        
+        cmd = [
+            *self._ffmpeg_base,
+            '-fflags', '+genpts',
+            '-f', 'concat',
+            '-safe', '0',
+            '-protocol_whitelist', 'file,pipe',
+            '-i', 'pipe:0',
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-movflags', '+faststart',
+            str(output_path)
+        ]
+        
+        self.logger.debug(f"Running: {' '.join(cmd)}")
+        
+        return self._run(cmd, input=concat_list.encode('utf-8'))
+    
+    def _concat_reencode(self, video1_path: Path, video2_path: Path,
+                         output_path: Path, has_audio: bool,
+                         on_progress: Optional[Callable[[Dict[str, str]], bool]] = None
+                         ) -> subprocess.CompletedProcess:
+        """Concatenate with the concat filter (re-encodes, handles mismatched clips)."""
+        if has_audio:
+            filter_graph = "[0:v][0:a][1:v][1:a]concat=n=2:v=1:a=1[v][a]"
+            maps = ['-map', '[v]', '-map', '[a]', '-c:a', 'aac']
+        else:
+            filter_graph = "[0:v][1:v]concat=n=2:v=1:a=0[v]"
+            maps = ['-map', '[v]']
+        
+        cmd = [
+            *self._ffmpeg_base,
+            '-i', str(video1_path),
+            '-i', str(video2_path),
+            '-filter_complex', filter_graph,
+            *maps,
+            '-c:v', 'libx264',
+            '-preset', 'ultrafast',
+            # Full decode + encode of both clips: use every core
+            '-threads', '0',
+            '-movflags', '+faststart',
+            str(output_path)
+        ]
+        
+        self.logger.debug(f"Running: {' '.join(cmd)}")
+        
+        if on_progress is not None:
+            return self._run_with_progress(cmd, on_progress)
+        return self._run(cmd)
 
 
 # Global instance
@@ -0,0 +1,77 @@
+"""
+Tests for video_processor stream signature parsing
+"""
+from src.video_processor import _has_audio, _parse_stream_signature
+
+
+# Real output of:
+# ffprobe -v error -show_entries stream=codec_type,codec_name,profile,width,
+#   height,pix_fmt,time_base,sample_rate,channels -of json clip.mp4
+# (ffprobe prints codec_name before codec_type, whatever the entry order)
+TWO_STREAM_OUTPUT = b"""{
+    "programs": [
+
+    ],
+    "streams": [
+        {
+            "codec_name": "h264",
+            "profile": "High",
+            "codec_type": "video",
+            "width": 720,
+            "height": 1280,
+            "pix_fmt": "yuv420p",
+            "time_base": "1/12800"
+        },
+        {
+            "codec_name": "aac",
+            "profile": "LC",
+            "codec_type": "audio",
+            "sample_rate": "44100",
+            "channels": 2,
+            "time_base": "1/44100"
+        }
+    ]
+}
+"""
+
+VIDEO_ONLY_OUTPUT = b"""{
+    "programs": [
+
+    ],
+    "streams": [
+        {
+            "codec_name": "h264",
+            "profile": "High",
+            "codec_type": "video",
+            "width": 720,
+            "height": 1280,
+            "pix_fmt": "yuv420p",
+            "time_base": "1/12800"
+        }
+    ]
+}
+"""
+
+
+def test_parse_two_streams_puts_codec_type_first():
+    signature = _parse_stream_signature(TWO_STREAM_OUTPUT)
+    assert signature == (
+        ("video", "h264", "High", "720", "1280", "yuv420p", "1/12800", "", ""),
+        ("audio", "aac", "LC", "", "", "", "1/44100", "44100", "2"),
+    )
+
+
+def test_has_audio_detects_audio_stream():
+    assert _has_audio(_parse_stream_signature(TWO_STREAM_OUTPUT))
+
+
+def test_has_audio_false_for_video_only():
+    assert not _has_audio(_parse_stream_signature(VIDEO_ONLY_OUTPUT))
+
+
+def test_has_audio_false_when_probe_failed():
+    assert not _has_audio(None)
+
+
+def test_parse_invalid_output_returns_none():
+    assert _parse_stream_signature(b"not json") is None